@@ -0,0 +1 @@
+# Benchmarks of the crashes analytics: synthetic data generator (generate_data) and benchmark runner (run_benchmark)
@@ -0,0 +1,215 @@
+# Synthetic crash data generator for the benchmarks
+## Writes the six <table>_use.csv files with the columns of crashes.schemas at a multiple of a base number of crashes.
+## Cardinalities and skew follow the case study extract: most crashes have two units and one or two persons per unit,
+## a few pile-ups have dozens of units and buses carry dozens of persons; values of the columns the analyses filter or
+## group on are drawn from their real vocabularies with long-tailed (Zipf-like) frequencies.
+## The same seed and scale always produce the same files.
+##
+## python -m benchmarks.generate_data --scale 10 --output ./Data/Benchmark_10x
+import argparse
+import csv
+import os
+import random
+
+from pyspark.sql.types import StringType
+
+from crashes.schemas import table_schemas
+
+base_crashes = 25000
+first_crash_id = 14000000
+
+
+## Weighted vocabulary of a column: ([values], [cumulative weights])
+def vocabulary(weightedValues):
+    values, cumulative_weights, total = [], [], 0
+    for value, weight in weightedValues:
+        total += weight
+        values.append(value)
+        cumulative_weights.append(total)
+    return values, cumulative_weights
+
+## Vocabulary whose frequencies decrease as 1 / rank
+def zipfVocabulary(values, exponent = 1.0):
+    return vocabulary([(value, 1.0 / (rank + 1) ** exponent) for rank, value in enumerate(values)])
+
+states = ["AL", "AK", "AZ", "AR", "CA", "CO", "CT", "DE", "FL", "GA", "HI", "ID", "IL", "IN", "IA", "KS", "KY", "LA", "ME", "MD", "MA", "MI", "MN", "MS", "MO", \
+          "MT", "NE", "NV", "NH", "NJ", "NM", "NY", "NC", "ND", "OH", "OK", "OR", "PA", "RI", "SC", "SD", "TN", "UT", "VT", "VA", "WA", "WV", "WI", "WY", "MX"]
+state_names = ["Alabama", "Arizona", "Arkansas", "California", "Colorado", "Florida", "Georgia", "Illinois", "Kansas", "Louisiana", "Mexico", "Mississippi", \
+               "Missouri", "New Mexico", "New York", "North Carolina", "Ohio", "Oklahoma", "Tennessee", "Virginia", "Washington"]
+
+vocabularies = {
+    "PRSN_INJRY_SEV_ID" : vocabulary([("NOT INJURED", 60), ("POSSIBLE INJURY", 15), ("NON-INCAPACITATING INJURY", 11), ("INCAPACITATING INJURY", 4), ("KILLED", 0.6), ("UNKNOWN", 9.4)]),
+    "PRSN_GNDR_ID" : vocabulary([("MALE", 55), ("FEMALE", 40), ("UNKNOWN", 4), ("NA", 1)]),
+    "PRSN_ETHNICITY_ID" : vocabulary([("WHITE", 40), ("HISPANIC", 30), ("BLACK", 15), ("ASIAN", 4), ("UNKNOWN", 7), ("OTHER", 2), ("AMER. INDIAN/ALASKAN NATIVE", 1), ("NA", 1)]),
+    "DRVR_LIC_TYPE_ID" : vocabulary([("DRIVER LICENSE", 72), ("COMMERCIAL DRIVER LIC.", 5), ("UNLICENSED", 7), ("ID CARD", 2), ("UNKNOWN", 9), ("OTHER", 4), ("OCCUPATIONAL", 1)]),
+    "DRVR_LIC_STATE_ID" : vocabulary([("Texas", 88), ("NA", 3), ("Unknown", 2)] + [(state, 7.0 / len(state_names)) for state in state_names]),
+    "DRVR_LIC_CLS_ID" : vocabulary([("CLASS C", 75), ("CLASS A", 5), ("CLASS M", 2), ("UNLICENSED", 7), ("UNKNOWN", 11)]),
+    "DRVR_ZIP" : zipfVocabulary([str(zip_code) for zip_code in range(75001, 79999, 3)], 0.8),
+    "UNIT_DESC_ID" : vocabulary([("MOTOR VEHICLE", 90), ("PEDESTRIAN", 3), ("PEDALCYCLIST", 2), ("PARKED CAR", 3), ("OTHER (EXPLAIN IN NARRATIVE)", 1), ("TRAIN", 0.2), ("TOWED/PUSHED/TRAILER", 0.8)]),
+    "VEH_BODY_STYL_ID" : vocabulary([("PASSENGER CAR, 4-DOOR", 35), ("SPORT UTILITY VEHICLE", 20), ("PICKUP", 18), ("PASSENGER CAR, 2-DOOR", 6), ("VAN", 5), ("TRUCK", 3), ("TRUCK TRACTOR", 3), \
+                                     ("MOTORCYCLE", 2), ("POLICE CAR/TRUCK", 1), ("BUS", 0.5), ("NA", 3), ("UNKNOWN", 1), ("NOT REPORTED", 1), ("OTHER  (EXPLAIN IN NARRATIVE)", 1.5)]),
+    "VEH_MAKE_ID" : zipfVocabulary(["FORD", "CHEVROLET", "TOYOTA", "DODGE", "NISSAN", "HONDA", "GMC", "NA", "HYUNDAI", "JEEP", "KIA", "CHRYSLER", "MAZDA", "VOLKSWAGEN", "BMW", \
+                                    "MERCEDES-BENZ", "LEXUS", "BUICK", "CADILLAC", "LINCOLN", "SUBARU", "ACURA", "INFINITI", "MITSUBISHI", "AUDI", "PONTIAC", "FREIGHTLINER", \
+                                    "KENWORTH", "PETERBILT", "INTERNATIONAL", "HARLEY-DAVIDSON", "VOLVO", "TESLA", "MINI", "SCION", "SATURN", "MERCURY", "OLDSMOBILE", "SUZUKI", "FIAT"], 0.9),
+    "VEH_COLOR_ID" : zipfVocabulary(["BLK", "WHI", "GRY", "SIL", "RED", "BLU", "MAR", "GRN", "TAN", "GLD", "BRO", "99", "YEL", "ONG", "PLE", "BGE", "TEA", "CPR", "98", "NA"], 1.1),
+    "VEH_LIC_STATE_ID" : vocabulary([("TX", 86), ("NA", 3)] + [(state, 11.0 / len(states)) for state in states]),
+    "FIN_RESP_TYPE_ID" : vocabulary([("PROOF OF LIABILITY INSURANCE", 50), ("LIABILITY INSURANCE POLICY", 25), ("NA", 20), ("INSURANCE BINDER", 2), ("CERTIFICATE OF SELF-INSURANCE", 2), ("SURETY BOND", 1)]),
+    "FIN_RESP_PROOF_ID" : vocabulary([("1", 80), ("2", 5), ("NA", 15)]),
+    "VEH_DMAG_SCL_1_ID" : vocabulary([("DAMAGED 1 MINIMUM", 8), ("DAMAGED 2", 20), ("DAMAGED 3", 22), ("DAMAGED 4", 16), ("DAMAGED 5", 9), ("DAMAGED 6", 5), ("DAMAGED 7 HIGHEST", 3), \
+                                      ("NO DAMAGE", 10), ("NA", 6), ("INVALID VALUE", 1)]),
+    "VEH_DMAG_SCL_2_ID" : vocabulary([("NA", 70), ("DAMAGED 2", 6), ("DAMAGED 3", 7), ("DAMAGED 4", 6), ("DAMAGED 5", 5), ("DAMAGED 6", 3), ("DAMAGED 7 HIGHEST", 2), ("NO DAMAGE", 1)]),
+    "CONTRIB_FACTR_1_ID" : vocabulary([("NA", 45), ("DRIVER INATTENTION", 12), ("FAILED TO CONTROL SPEED", 10), ("FAILED TO YIELD RIGHT OF WAY - STOP SIGN", 4), ("FOLLOWED TOO CLOSELY", 6), \
+                                       ("UNSAFE SPEED", 5), ("UNDER INFLUENCE - ALCOHOL", 3), ("HAD BEEN DRINKING", 1.5), ("DISREGARD STOP AND GO SIGNAL", 3), ("CHANGED LANE WHEN UNSAFE", 4), ("DISTRACTION IN VEHICLE", 6.5)]),
+    "CONTRIB_FACTR_2_ID" : vocabulary([("NA", 85), ("UNSAFE SPEED", 4), ("HAD BEEN DRINKING", 2), ("UNDER INFLUENCE - ALCOHOL", 1), ("DRIVER INATTENTION", 5), ("FATIGUED OR ASLEEP", 3)]),
+    "CHARGE" : zipfVocabulary(["FAILED TO CONTROL SPEED", "NO DRIVERS LICENSE", "FAIL TO MAINTAIN FINANCIAL RESPONSIBILITY", "DWI", "SPEEDING - (OVER LIMIT)", "RAN RED LIGHT", \
+                               "FAILED TO YIELD RIGHT OF WAY", "UNSAFE LANE CHANGE", "NO INSURANCE", "EXPIRED REGISTRATION", "SPEEDING - 10% OR MORE ABOVE POSTED SPEED", \
+                               "FOLLOWING TOO CLOSELY", "DRIVING WHILE LICENSE INVALID", "UNSAFE SPEED", "FAILURE TO STOP AT STOP SIGN", "NO SEAT BELT"], 0.7),
+    "DAMAGED_PROPERTY" : zipfVocabulary(["FENCE", "POLE", "MAILBOX", "GUARDRAIL", "SIGN", "TREE", "CURB", "HOUSE", "BUILDING", "NONE", "LIGHT POLE", "UTILITY POLE", "GATE"]),
+    "DRVR_LIC_ENDORS_ID" : vocabulary([("NONE", 80), ("UNLICENSED", 7), ("UNKNOWN", 7), ("CLASS M MOTORCYCLE", 2), ("OTHER/OUT OF STATE", 3), ("TANK VEHICLE", 1)]),
+    "DRVR_LIC_RESTRIC_ID" : vocabulary([("NONE", 65), ("CORRECTIVE LENSES", 18), ("UNLICENSED", 7), ("OTHER/OUT OF STATE", 6), ("UNKNOWN", 4)]),
+}
+
+## Units per crash (mega crashes aside) and additional occupants per motor vehicle
+units_per_crash = vocabulary([(1, 22), (2, 60), (3, 12), (4, 4), (5, 1.5), (6, 0.5)])
+occupants_per_vehicle = vocabulary([(0, 70), (1, 18), (2, 7), (3, 3), (4, 2)])
+mega_crash_probability = 0.0005
+
+
+class CrashDataGenerator:
+    def __init__(self, outputPath, seed):
+        self.random = random.Random(seed)
+        self.output_path = outputPath
+        self.files = {}
+        self.writers = {}
+        self.row_counts = {}
+
+    def choice(self, columnName):
+        values, cumulative_weights = vocabularies[columnName]
+        return self.random.choices(values, cum_weights = cumulative_weights)[0]
+
+    def count(self, distribution):
+        values, cumulative_weights = distribution
+        return self.random.choices(values, cum_weights = cumulative_weights)[0]
+
+    def __enter__(self):
+        os.makedirs(self.output_path, exist_ok = True)
+        for table_name, schema in table_schemas.items():
+            self.files[table_name] = open(os.path.join(self.output_path, f"{table_name}_use.csv"), "w", newline = "")
+            self.writers[table_name] = csv.writer(self.files[table_name])
+            self.writers[table_name].writerow(schema.fieldNames())
+            self.row_counts[table_name] = 0
+        return self
+
+    def __exit__(self, *exc_info):
+        for output_file in self.files.values():
+            output_file.close()
+        return False
+
+    ## Write a row of a table; columns without a value are NA (strings) or empty (numbers and timestamps)
+    def write(self, tableName, values):
+        row = []
+        for field in table_schemas[tableName].fields:
+            if field.name in values:
+                row.append(values[field.name])
+            else:
+                row.append("NA" if isinstance(field.dataType, StringType) else "")
+        self.writers[tableName].writerow(row)
+        self.row_counts[tableName] += 1
+
+    ## Person of a unit; returns its injury counts, which are added up on the unit
+    def writePerson(self, crashId, unitNumber, personNumber, isDriver):
+        injury_severity = self.choice("PRSN_INJRY_SEV_ID")
+        injury_counts = {"INCAP_INJRY_CNT" : int(injury_severity == "INCAPACITATING INJURY"), \
+                         "NONINCAP_INJRY_CNT" : int(injury_severity == "NON-INCAPACITATING INJURY"), \
+                         "POSS_INJRY_CNT" : int(injury_severity == "POSSIBLE INJURY"), \
+                         "NON_INJRY_CNT" : int(injury_severity == "NOT INJURED"), \
+                         "UNKN_INJRY_CNT" : int(injury_severity == "UNKNOWN"), \
+                         "DEATH_CNT" : int(injury_severity == "KILLED")}
+        injury_counts["TOT_INJRY_CNT"] = injury_counts["INCAP_INJRY_CNT"] + injury_counts["NONINCAP_INJRY_CNT"] + injury_counts["POSS_INJRY_CNT"]
+        person = {"CRASH_ID" : crashId, "UNIT_NBR" : unitNumber, "PRSN_NBR" : personNumber, \
+                  "PRSN_TYPE_ID" : "DRIVER" if isDriver else "PASSENGER/OCCUPANT", \
+                  "PRSN_INJRY_SEV_ID" : injury_severity, \
+                  "PRSN_AGE" : self.random.randint(16, 85) if isDriver else self.random.randint(0, 85), \
+                  "PRSN_ETHNICITY_ID" : self.choice("PRSN_ETHNICITY_ID"), \
+                  "PRSN_GNDR_ID" : self.choice("PRSN_GNDR_ID")}
+        person.update(injury_counts)
+        if isDriver:
+            person.update({"DRVR_LIC_TYPE_ID" : self.choice("DRVR_LIC_TYPE_ID"), \
+                           "DRVR_LIC_STATE_ID" : self.choice("DRVR_LIC_STATE_ID"), \
+                           "DRVR_LIC_CLS_ID" : self.choice("DRVR_LIC_CLS_ID"), \
+                           "DRVR_ZIP" : self.choice("DRVR_ZIP") if self.random.random() < 0.85 else ""})
+            charges = 0 if self.random.random() < 0.6 else (1 if self.random.random() < 0.85 else 2)
+            for _ in range(charges):
+                self.write("Charges", {"CRASH_ID" : crashId, "UNIT_NBR" : unitNumber, "PRSN_NBR" : personNumber, \
+                                       "CHARGE" : self.choice("CHARGE"), \
+                                       "CITATION_NBR" : f"C{self.random.randint(10 ** 7, 10 ** 8 - 1)}"})
+        self.write("Primary_Person", person)
+        return injury_counts
+
+    def writeUnit(self, crashId, unitNumber):
+        unit_description = self.choice("UNIT_DESC_ID")
+        body_style = self.choice("VEH_BODY_STYL_ID") if unit_description == "MOTOR VEHICLE" else "NA"
+        if unit_description == "PARKED CAR":
+            persons = 0
+        elif body_style == "BUS":
+            persons = self.random.randint(5, 40)
+        elif unit_description == "MOTOR VEHICLE":
+            persons = 1 + self.count(occupants_per_vehicle)
+        else:
+            persons = 1
+        unit = {"CRASH_ID" : crashId, "UNIT_NBR" : unitNumber, "UNIT_DESC_ID" : unit_description, \
+                "VEH_BODY_STYL_ID" : body_style, \
+                "VEH_LIC_STATE_ID" : self.choice("VEH_LIC_STATE_ID"), \
+                "VEH_MOD_YEAR" : self.random.randint(1990, 2023), \
+                "VEH_COLOR_ID" : self.choice("VEH_COLOR_ID"), \
+                "VEH_MAKE_ID" : self.choice("VEH_MAKE_ID"), \
+                "FIN_RESP_TYPE_ID" : self.choice("FIN_RESP_TYPE_ID"), \
+                "FIN_RESP_PROOF_ID" : self.choice("FIN_RESP_PROOF_ID"), \
+                "VEH_DMAG_SCL_1_ID" : self.choice("VEH_DMAG_SCL_1_ID"), \
+                "VEH_DMAG_SCL_2_ID" : self.choice("VEH_DMAG_SCL_2_ID"), \
+                "CONTRIB_FACTR_1_ID" : self.choice("CONTRIB_FACTR_1_ID"), \
+                "CONTRIB_FACTR_2_ID" : self.choice("CONTRIB_FACTR_2_ID"), \
+                "OWNR_ZIP" : self.choice("DRVR_ZIP")}
+        unit_injury_counts = {}
+        for person_number in range(1, persons + 1):
+            for count_column, count_value in self.writePerson(crashId, unitNumber, person_number, person_number == 1).items():
+                unit_injury_counts[count_column] = unit_injury_counts.get(count_column, 0) + count_value
+        unit.update(unit_injury_counts)
+        self.write("Units", unit)
+        if persons > 0:
+            self.write("Endorse", {"CRASH_ID" : crashId, "UNIT_NBR" : unitNumber, "DRVR_LIC_ENDORS_ID" : self.choice("DRVR_LIC_ENDORS_ID")})
+            self.write("Restrict", {"CRASH_ID" : crashId, "UNIT_NBR" : unitNumber, "DRVR_LIC_RESTRIC_ID" : self.choice("DRVR_LIC_RESTRIC_ID")})
+
+    def writeCrash(self, crashId):
+        if self.random.random() < mega_crash_probability:
+            units = self.random.randint(10, 60)
+        else:
+            units = self.count(units_per_crash)
+        for unit_number in range(1, units + 1):
+            self.writeUnit(crashId, unit_number)
+        if self.random.random() < 0.25:
+            for _ in range(self.random.randint(1, 3)):
+                self.write("Damages", {"CRASH_ID" : crashId, "DAMAGED_PROPERTY" : self.choice("DAMAGED_PROPERTY")})
+
+
+## Generate the six tables for scale x base crashes; returns the number of rows written to each table
+def generateCrashData(outputPath, scale, seed = 42, baseCrashes = base_crashes):
+    with CrashDataGenerator(outputPath, seed) as generator:
+        for crash_id in range(first_crash_id, first_crash_id + int(scale * baseCrashes)):
+            generator.writeCrash(crash_id)
+        return dict(generator.row_counts)
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Generate synthetic crash data for the benchmarks")
+    parser.add_argument("--scale", type = float, default = 1, help = f"multiple of {base_crashes} crashes to generate (default: 1)")
+    parser.add_argument("--output", required = True, help = "directory the <table>_use.csv files are written to")
+    parser.add_argument("--seed", type = int, default = 42, help = "random seed (default: 42)")
+    parser.add_argument("--base-crashes", type = int, default = base_crashes, help = f"crashes at scale 1 (default: {base_crashes})")
+    args = parser.parse_args(argv)
+    row_counts = generateCrashData(args.output, args.scale, args.seed, args.base_crashes)
+    for table_name, rows in row_counts.items():
+        print(f"{table_name:<16} {rows:>12,} rows")
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,143 @@
+# Benchmark of the analyses
+## The inputs are loaded (and converted to parquet) once, then every analysis is run on its own, with its own shared join
+## views and groupings, so that its metrics are not mixed with those of the others. For each analysis the benchmark records its wall-clock
+## time and the jobs, shuffle, spill and peak memory metrics of its job group (see crashes.metrics), and writes them as JSON.
+## A previous benchmark file can be given as a baseline: analyses slower than the baseline by more than the tolerance are
+## reported and the benchmark exits with status 1.
+##
+## python -m benchmarks.run_benchmark --scale 10
+## python -m benchmarks.run_benchmark --scale 10 --baseline ./Benchmark_Results/benchmark_10x_<timestamp>.json
+import argparse
+from datetime import datetime
+import json
+import os
+import platform
+import time
+
+from benchmarks.generate_data import base_crashes, generateCrashData
+from crashes.config import CrashesConfig
+from crashes.context import AnalysisContext
+from crashes.groupings import SharedGroupings
+from crashes.joins import JoinViews
+from crashes.metrics import SparkMetrics
+from crashes.registry import selectAnalyses, viewConsumers, sourceGroupings, groupingConsumers
+from crashes.runner import createSparkSession, loadTables, runAnalysis
+
+benchmark_filePath = "./Benchmark_Results"
+
+
+## Data directory of a scale, generated if it does not hold the input files yet
+def benchmarkData(dataPath, scale, seed, baseCrashes):
+    data_config = CrashesConfig(data_filePath = dataPath)
+    if not os.path.exists(data_config.csvFilePath("Units")):
+        generateCrashData(dataPath, scale, seed, baseCrashes)
+    return dataPath
+
+## Run every analysis on its own and collect its metrics
+def benchmarkAnalyses(spark, config, tables, specs):
+    sc = spark.sparkContext
+    spark_metrics = SparkMetrics(sc)
+    analysis_metrics = []
+    for spec in specs:
+        job_group = f"benchmark-{spec.number}"
+        join_views = JoinViews(config, tables, viewConsumers([spec]))
+        groupings = SharedGroupings(config, tables, join_views, sourceGroupings([spec]), groupingConsumers([spec]))
+        ctx = AnalysisContext(spark, config, tables, join_views, groupings)
+        result, wall_time = runAnalysis(ctx, spec, None, job_group)
+        metrics = {"number" : spec.number, "name" : spec.name, "wall_time_s" : round(wall_time, 3), "result" : str(result)}
+        metrics.update(spark_metrics.jobGroupMetrics(job_group))
+        analysis_metrics.append(metrics)
+        print(f"Analysis {spec.number}: {wall_time:8.3f} s, shuffle read {metrics['shuffle_read_bytes']:,} B, shuffle write {metrics['shuffle_write_bytes']:,} B, spilled {metrics['disk_bytes_spilled']:,} B")
+    sc.setJobGroup(None, None)
+    return analysis_metrics
+
+## Analyses slower than in the baseline benchmark by more than the tolerance (a fraction of the baseline time)
+def regressions(benchmark, baseline, tolerance):
+    baseline_times = {metrics["number"] : metrics["wall_time_s"] for metrics in baseline["analyses"]}
+    slower_analyses = []
+    for metrics in benchmark["analyses"]:
+        baseline_time = baseline_times.get(metrics["number"])
+        if baseline_time is not None and metrics["wall_time_s"] > baseline_time * (1 + tolerance):
+            slower_analyses.append((metrics["number"], baseline_time, metrics["wall_time_s"]))
+    return slower_analyses
+
+def parseArguments(argv = None):
+    defaults = CrashesConfig()
+    parser = argparse.ArgumentParser(prog = "benchmarks.run_benchmark", description = "Benchmark every analysis on its own on synthetic data")
+    parser.add_argument("--scale", type = float, default = 1, \
+                        help = f"multiple of {base_crashes} synthetic crashes (default: 1); the data is generated on first use")
+    parser.add_argument("--data-path", default = None, \
+                        help = "directory of the <table>_use.csv input files (default: ./Data/Benchmark_<scale>x)")
+    parser.add_argument("--base-crashes", type = int, default = base_crashes, \
+                        help = f"crashes at scale 1 when generating the data (default: {base_crashes})")
+    parser.add_argument("--seed", type = int, default = 42, \
+                        help = "random seed when generating the data (default: 42)")
+    parser.add_argument("--analyses", \
+                        help = "comma separated numbers or names of the analyses to benchmark (default: all)")
+    parser.add_argument("--master", default = defaults.master, \
+                        help = f"spark master (default: {defaults.master})")
+    parser.add_argument("--no-parquet", action = "store_true", \
+                        help = "read the csv files directly instead of their parquet copies")
+    parser.add_argument("--legacy-crash-id-joins", action = "store_true", \
+                        help = "join units, persons and charges on CRASH_ID only, as the original analyses did")
+    parser.add_argument("--output-path", default = benchmark_filePath, \
+                        help = f"directory the benchmark JSON files are written to (default: {benchmark_filePath})")
+    parser.add_argument("--baseline", \
+                        help = "benchmark JSON file to compare the wall-clock times with")
+    parser.add_argument("--tolerance", type = float, default = 0.2, \
+                        help = "slowdown over the baseline reported as a regression, as a fraction (default: 0.2)")
+    return parser, parser.parse_args(argv)
+
+def main(argv = None):
+    parser, args = parseArguments(argv)
+    try:
+        specs = selectAnalyses(args.analyses)
+    except ValueError as error:
+        parser.error(str(error))
+    scale_name = f"{args.scale:g}x"
+    data_path = benchmarkData(args.data_path or os.path.join("./Data", f"Benchmark_{scale_name}"), args.scale, args.seed, args.base_crashes)
+    config = CrashesConfig(app_name = f"crashes-benchmark-{scale_name}", \
+                           master = args.master, \
+                           executor_metrics_polling_interval = "100ms", \
+                           data_filePath = data_path, \
+                           use_parquet = not args.no_parquet, \
+                           legacy_crash_id_joins = args.legacy_crash_id_joins)
+    spark = createSparkSession(config)
+    try:
+        rejected_row_counts = {}
+        start_time = time.perf_counter()
+        tables = loadTables(spark, config, specs, rejected_row_counts)
+        ingestion_time = time.perf_counter() - start_time
+        analysis_metrics = benchmarkAnalyses(spark, config, tables, specs)
+        benchmark = {"scale" : args.scale, \
+                     "base_crashes" : args.base_crashes, \
+                     "seed" : args.seed, \
+                     "timestamp" : datetime.now().isoformat(timespec = "seconds"), \
+                     "spark_version" : spark.version, \
+                     "python_version" : platform.python_version(), \
+                     "master" : config.master, \
+                     "default_parallelism" : spark.sparkContext.defaultParallelism, \
+                     "config" : {"use_parquet" : config.use_parquet, "legacy_crash_id_joins" : config.legacy_crash_id_joins, "join_storage_level" : config.join_storage_level}, \
+                     "table_rows" : {table_name : table_df.count() for table_name, table_df in tables.items()}, \
+                     "rejected_rows" : rejected_row_counts, \
+                     "ingestion_time_s" : round(ingestion_time, 3), \
+                     "analyses" : analysis_metrics}
+    finally:
+        spark.stop()
+    os.makedirs(args.output_path, exist_ok = True)
+    benchmark_file = os.path.join(args.output_path, f"benchmark_{scale_name}_{datetime.now():%Y%m%d_%H%M%S}.json")
+    with open(benchmark_file, "w") as outputFile:
+        json.dump(benchmark, outputFile, indent = 2)
+    print(f"Benchmark written to {benchmark_file}")
+    if args.baseline:
+        with open(args.baseline) as inputFile:
+            baseline = json.load(inputFile)
+        slower_analyses = regressions(benchmark, baseline, args.tolerance)
+        for number, baseline_time, wall_time in slower_analyses:
+            print(f"Regression: analysis {number} took {wall_time:.3f} s against {baseline_time:.3f} s in the baseline")
+        if slower_analyses:
+            return 1
+    return 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
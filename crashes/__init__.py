@@ -0,0 +1,4 @@
+# BCG US Accidents/Crashes case study analytics
+## crashes.registry lists the analyses, crashes.runner runs a selection of them and crashes.cli is the command line.
+from crashes.config import CrashesConfig
+from crashes.registry import analysis_specs, selectAnalyses
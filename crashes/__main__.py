@@ -0,0 +1,6 @@
+# python -m crashes
+import sys
+
+from crashes.cli import main
+
+sys.exit(main())
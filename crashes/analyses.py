@@ -0,0 +1,144 @@
+# Analytics
+## Every analysis is split in two steps: the first reads its tables and shared views from the analysis context and
+## returns partial aggregates (DataFrames by name), the second derives the result of the analysis from them.
+## Partial aggregates are either sets of distinct CRASH_IDs or counts/sums by key, so that the aggregates of new crashes
+## can be merged into persisted ones (see crashes.incremental). A full run derives the result from the aggregates directly.
+## Results counting a set of CRASH_IDs may get it already counted (crashes.registry.crash_count_column): incremental runs
+## keep the number of CRASH_IDs of their sets instead of reading the sets of every batch to count them, and approximate runs
+## only estimate it (see AnalysisContext.crashIds).
+## The tables, columns, views, groupings and aggregates of each analysis are declared with it in crashes.registry.
+from pyspark.sql.functions import broadcast, col, count, rank, sum, lower
+from pyspark.sql.window import Window
+
+from crashes.registry import crash_count_column
+
+
+## Number of CRASH_IDs of a set, counted or read from the set given already counted
+def crashIdCount(crashIds):
+    if crash_count_column in crashIds.columns:
+        return crashIds.first()[crash_count_column]
+    return crashIds.count()
+
+
+## Analysis 1: Find the number of crashes (accidents) in which number of persons killed are male?
+def maleDeathCrashes(ctx):
+    primary_person_df = ctx.table("Primary_Person")
+    male_death_crash_ids = ctx.crashIds(primary_person_df.where((col("DEATH_CNT") > 0) & (col("PRSN_GNDR_ID") == "MALE")))
+    return {"male_death_crash_ids" : male_death_crash_ids}
+
+def maleDeathCrashCount(partials):
+    male_death_crash_counts = crashIdCount(partials["male_death_crash_ids"])
+    return male_death_crash_counts
+
+## Analysis 2: How many two wheelers are booked for crashes?
+def twoWheelersBooked(ctx):
+    two_wheeleres_crash_ids = ctx.crashIds(ctx.view("units_charges").where(col("VEH_BODY_STYL_ID") == "MOTORCYCLE"))
+    return {"two_wheeler_booked_crash_ids" : two_wheeleres_crash_ids}
+
+def twoWheelersBookedCount(partials):
+    two_wheeleres_crash_counts = crashIdCount(partials["two_wheeler_booked_crash_ids"])
+    return two_wheeleres_crash_counts
+
+## Analysis 3: Which state has highest number of accidents in which females are involved?
+def femaleAccidentsByState(ctx):
+    primary_person_df = ctx.table("Primary_Person")
+    female_acc_by_state = primary_person_df.where((col("PRSN_GNDR_ID") == "FEMALE")) \
+                                           .groupBy(col("DRVR_LIC_STATE_ID")) \
+                                           .agg(count(col("CRASH_ID")).alias("HIGH_CRASH_FEMALE"))
+    return {"female_accidents_by_state" : female_acc_by_state}
+
+def highestFemaleAccidentState(partials):
+    highest_female_acc_state = partials["female_accidents_by_state"].orderBy(col("HIGH_CRASH_FEMALE").desc()) \
+                                                                    .limit(1) \
+                                                                    .collect()[0][0]
+    return highest_female_acc_state
+
+## Analysis 4: Which are the Top 5th to 15th VEH_MAKE_IDs that contribute to a largest number of injuries including death
+## The injuries by make are a shared grouping of the units, computed with the other groupings of the units read from csv.
+def injuriesByVehicleMake(ctx):
+    injuries_by_veh_make = ctx.grouping("injuries_by_veh_make")
+    return {"injuries_by_veh_make" : injuries_by_veh_make}
+
+def topInjuryVehicleMakes5to15(partials):
+    veh_man_contr_highest_inj_5_to_15 = partials["injuries_by_veh_make"].withColumn("RNK", rank().over(Window.orderBy(col("TOT_INJ_VEH_ID").desc()))) \
+                                                                        .where(col("RNK").between(5, 15)) \
+                                                                        .collect()
+    return [{"VEH_MAKE_ID" : row["VEH_MAKE_ID"], "RANK" : row["RNK"]} for row in veh_man_contr_highest_inj_5_to_15]
+
+## Analysis 5: For all the body styles involved in crashes, mention the top ethnic user group of each unique body style
+def ethnicGroupsByBodyStyle(ctx):
+    ethnic_grp_body_style = ctx.view("person_units").where((~ col("PRSN_ETHNICITY_ID").isin(["UNKNOWN", "OTHER", "NA"])) \
+                                                    & (~ col("VEH_BODY_STYL_ID").isin(["UNKNOWN", "NA", "NOT REPORTED"])) \
+                                                    & (~ col("VEH_BODY_STYL_ID").like("%OTHER%"))) \
+                                                    .groupBy(col("VEH_BODY_STYL_ID"), col("PRSN_ETHNICITY_ID")) \
+                                                    .agg(count(col("CRASH_ID")).alias("ETHNICITY_CRASH_CNT"))
+    return {"ethnic_groups_by_body_style" : ethnic_grp_body_style}
+
+def topEthnicGroupByBodyStyle(partials):
+    window_spec = Window.partitionBy("VEH_BODY_STYL_ID").orderBy(col("ETHNICITY_CRASH_CNT"))
+    top_ethnic_grp_body_style = partials["ethnic_groups_by_body_style"].withColumn("RNK", rank().over(window_spec)) \
+                                                                       .where(col("RNK") == 1) \
+                                                                       .select("VEH_BODY_STYL_ID", "PRSN_ETHNICITY_ID") \
+                                                                       .collect()
+    return [{"VEH_BODY_STYL_ID" : row["VEH_BODY_STYL_ID"], "PRSN_ETHNICITY_ID" : row["PRSN_ETHNICITY_ID"]} for row in top_ethnic_grp_body_style]
+
+## Analysis 6: Among the crashed cars, what are the Top 5 Zip Codes with highest number crashes with alcohols as the contributing factor to a crash (Use Driver Zip Code)
+def alcoholCarCrashesByZipCode(ctx):
+    alc_car_crash_by_zipcode = ctx.view("person_units").where((col("VEH_BODY_STYL_ID").isin("PASSENGER CAR, 4-DOOR", "PASSENGER CAR, 2-DOOR", "POLICE CAR/TRUCK")) \
+                                                       & ((lower(col("CONTRIB_FACTR_1_ID")).contains("alcohol")) | (lower(col("CONTRIB_FACTR_2_ID")).contains("alcohol"))) \
+                                                       & (col("DRVR_ZIP").isNotNull())) \
+                                                       .groupBy(col("DRVR_ZIP")) \
+                                                       .agg(count(col("CRASH_ID")).alias("CAR_CRASH_CNT"))
+    return {"alcohol_car_crashes_by_zip" : alc_car_crash_by_zipcode}
+
+def topAlcoholCrashZipCodes(partials):
+    top_5_zipcodes_car_crash_contr_alc = partials["alcohol_car_crashes_by_zip"].withColumn("RNK", rank().over(Window.orderBy(col("CAR_CRASH_CNT").desc()))) \
+                                                                               .where(col("RNK").between(1, 5)) \
+                                                                               .select("DRVR_ZIP", "RNK") \
+                                                                               .collect()
+    return [{"DRVR_ZIP" : row["DRVR_ZIP"], "RANK" : row["RNK"]} for row in top_5_zipcodes_car_crash_contr_alc]
+
+## Analysis 7: Count of Distinct Crash IDs where No Damaged Property was observed and Damage Level (VEH_DMAG_SCL~) is above 4 and car avails Insurance
+## Columns are referenced by name: the tables of an incremental batch are filtered by the same DataFrame, which spark would
+## otherwise report as an ambiguous self-join.
+def insuredHighDamageCrashes(ctx):
+    units_df = ctx.table("Units")
+    damages_df = ctx.table("Damages")
+    crash_npd_dm_lvl_4_ins_ids = ctx.crashIds(units_df.join(damages_df, on = ["CRASH_ID"], how = "left") \
+                                                      .where((col("DAMAGED_PROPERTY").isNull()) & ((col("VEH_DMAG_SCL_1_ID").isin("DAMAGED 5", "DAMAGED 6", "DAMAGED 7 HIGHEST")) | (col("VEH_DMAG_SCL_2_ID").isin("DAMAGED 5", "DAMAGED 6", "DAMAGED 7 HIGHEST"))) & (col("FIN_RESP_TYPE_ID").isin("PROOF OF LIABILITY INSURANCE", "LIABILITY INSURANCE POLICY"))))
+    return {"insured_damage_crash_ids" : crash_npd_dm_lvl_4_ins_ids}
+
+def insuredHighDamageCrashCount(partials):
+    crash_cnt_npd_dm_lvl_4_ins = crashIdCount(partials["insured_damage_crash_ids"])
+    return crash_cnt_npd_dm_lvl_4_ins
+
+## Analysis 8: Determine the Top 5 Vehicle Makes where drivers are charged with speeding related offences, has licensed Drivers, used top 10 used vehicle colours and has car licensed with the Top 25 states with highest number of offences (to be deduced from the data)
+## The speeding offences are counted by make, colour and state, so that the top colours and states can be applied after merging.
+## The top colours and states are kept as (broadcast) DataFrames and applied with semi-joins, without a round trip to the driver.
+## The units by colour and offences by state are shared groupings; approximate runs count them on a sample of their rows.
+def speedingOffencesByVehicle(ctx):
+    veh_col_cnt = ctx.grouping("units_by_veh_color")
+    veh_lic_state_off_cnt = ctx.grouping("offences_by_veh_lic_state")
+    speed_off_by_veh = ctx.view("units_charges_person").where((lower(col("CHARGE")).contains("speed")) \
+                                                       & (col("DRVR_LIC_TYPE_ID").isin("DRIVER LICENSE", "COMMERCIAL DRIVER LIC."))) \
+                                                       .groupBy(col("VEH_MAKE_ID"), col("VEH_COLOR_ID"), col("VEH_LIC_STATE_ID")) \
+                                                       .agg(count("*").alias("OFFENCE_CNT"))
+    return {"units_by_veh_color" : veh_col_cnt, \
+            "offences_by_veh_lic_state" : veh_lic_state_off_cnt, \
+            "speeding_offences_by_veh" : speed_off_by_veh}
+
+def topSpeedingVehicleMakes(partials):
+    top_10_used_veh_color = partials["units_by_veh_color"].orderBy(col("VEH_COL_CNT").desc()) \
+                                                          .limit(10) \
+                                                          .select("VEH_COLOR_ID")
+    top_25_state_with_high_off = partials["offences_by_veh_lic_state"].orderBy(col("VEH_LIC_STATE_CNT").desc()) \
+                                                                      .limit(25) \
+                                                                      .select("VEH_LIC_STATE_ID")
+    top_5_veh_manf_speed_off_to_25_stat = partials["speeding_offences_by_veh"].join(broadcast(top_10_used_veh_color), on = ["VEH_COLOR_ID"], how = "left_semi") \
+                                                                              .join(broadcast(top_25_state_with_high_off), on = ["VEH_LIC_STATE_ID"], how = "left_semi") \
+                                                                              .groupBy(col("VEH_MAKE_ID")) \
+                                                                              .agg(sum(col("OFFENCE_CNT")).alias("OFFENCE_CNT")) \
+                                                                              .orderBy(col("OFFENCE_CNT").desc()) \
+                                                                              .limit(5) \
+                                                                              .collect()
+    return [{"VEH_MAKE_ID" : row["VEH_MAKE_ID"], "OFFENCE_CNT" : row["OFFENCE_CNT"]} for row in top_5_veh_manf_speed_off_to_25_stat]
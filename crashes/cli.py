@@ -0,0 +1,106 @@
+# Command line entry point
+## Spark is only imported once the selected analyses are run, so --help and --list return immediately.
+import argparse
+import sys
+
+from crashes.config import CrashesConfig, malformed_row_policies, execution_modes, join_storage_levels
+from crashes.registry import analysis_specs, selectAnalyses
+
+
+def parseArguments(argv = None):
+    defaults = CrashesConfig()
+    parser = argparse.ArgumentParser(prog = "crashes", description = "BCG US Accidents/Crashes case study analytics")
+    parser.add_argument("--analyses", \
+                        help = "comma separated numbers or names of the analyses to run (default: all), e.g. 1,4,7")
+    parser.add_argument("--list", action = "store_true", \
+                        help = "list the available analyses and exit")
+    parser.add_argument("--master", default = defaults.master, \
+                        help = f"spark master (default: {defaults.master})")
+    parser.add_argument("--data-path", default = defaults.data_filePath, \
+                        help = f"directory of the <table>_use.csv input files (default: {defaults.data_filePath})")
+    parser.add_argument("--result-path", default = defaults.result_filePath, \
+                        help = f"directory the results and reports are written to (default: {defaults.result_filePath})")
+    parser.add_argument("--parquet-path", default = None, \
+                        help = "directory of the parquet copies of the inputs (default: <data-path>/Parquet)")
+    parser.add_argument("--no-parquet", action = "store_true", \
+                        help = "read the csv files directly instead of their parquet copies")
+    parser.add_argument("--malformed-row-policy", choices = malformed_row_policies, default = defaults.malformed_row_policy, \
+                        help = f"what to do with rows that do not match their schema (default: {defaults.malformed_row_policy})")
+    parser.add_argument("--join-storage-level", choices = join_storage_levels, default = defaults.join_storage_level, \
+                        help = f"storage level of the shared join views (default: {defaults.join_storage_level})")
+    parser.add_argument("--legacy-crash-id-joins", action = "store_true", \
+                        help = "join units, persons and charges on CRASH_ID only, as the original analyses did")
+    parser.add_argument("--broadcast-threshold", type = int, default = defaults.broadcast_threshold_bytes, \
+                        help = f"broadcast join sides estimated smaller than this many bytes, 0 to never broadcast (default: {defaults.broadcast_threshold_bytes})")
+    parser.add_argument("--no-skew-join", action = "store_true", \
+                        help = "do not split skewed join partitions (e.g. of pile-up crashes) during adaptive execution")
+    parser.add_argument("--approximate", action = "store_true", \
+                        help = "exploratory run: estimate the distinct crash counts and count the top N groupings on a sample of their rows")
+    parser.add_argument("--approximate-distinct-error", type = float, default = defaults.approximate_distinct_error, \
+                        help = f"relative standard deviation of the approximate distinct crash counts (default: {defaults.approximate_distinct_error})")
+    parser.add_argument("--approximate-top-n-error", type = float, default = defaults.approximate_top_n_error, \
+                        help = f"standard error of the share of the rows counted for a key of an approximate top N grouping (default: {defaults.approximate_top_n_error})")
+    parser.add_argument("--execution-mode", choices = execution_modes, default = defaults.execution_mode, \
+                        help = f"run the analyses one after another or as concurrent spark jobs (default: {defaults.execution_mode})")
+    parser.add_argument("--max-concurrent-analyses", type = int, default = defaults.max_concurrent_analyses, \
+                        help = f"number of analyses running at the same time in concurrent mode (default: {defaults.max_concurrent_analyses})")
+    parser.add_argument("--fair-scheduler-file", default = None, \
+                        help = "FAIR scheduler allocation file defining the weights of the analysis pools")
+    parser.add_argument("--compare-execution-modes", action = "store_true", \
+                        help = "run the analyses sequentially, then concurrently, and report the wall-clock time of both")
+    parser.add_argument("--no-instrumentation", action = "store_true", \
+                        help = f"do not collect the stage timings, task skew, shuffle volumes and query plans of the analyses into {defaults.metrics_fileName}")
+    parser.add_argument("--incremental", action = "store_true", \
+                        help = "merge the new batches of the batch directory into the persisted aggregates instead of recomputing from all data")
+    parser.add_argument("--batch-path", default = None, \
+                        help = "directory holding one sub-directory of <table>_use.csv files per batch (default: <data-path>/Batches)")
+    parser.add_argument("--state-path", default = None, \
+                        help = "directory of the persisted aggregates of incremental runs (default: <data-path>/State)")
+    return parser, parser.parse_args(argv)
+
+def main(argv = None):
+    parser, args = parseArguments(argv)
+    if args.list:
+        for spec in analysis_specs:
+            print(f"{spec.number}  {spec.name:<26} {spec.description}")
+        return 0
+    try:
+        specs = selectAnalyses(args.analyses)
+    except ValueError as error:
+        parser.error(str(error))
+    if args.max_concurrent_analyses < 1:
+        parser.error("--max-concurrent-analyses must be at least 1")
+    if args.approximate and args.incremental:
+        parser.error("--approximate cannot be combined with --incremental")
+    # Below 0.01, spark's HyperLogLog++ costs more than an exact count; above 0.39 it cannot be built
+    if not 0.01 <= args.approximate_distinct_error <= 0.39:
+        parser.error("--approximate-distinct-error must be between 0.01 and 0.39")
+    if not 0 < args.approximate_top_n_error < 1:
+        parser.error("--approximate-top-n-error must be above 0 and below 1")
+    config = CrashesConfig(master = args.master, \
+                           data_filePath = args.data_path, \
+                           result_filePath = args.result_path, \
+                           parquet_filePath = args.parquet_path, \
+                           use_parquet = not args.no_parquet, \
+                           malformed_row_policy = args.malformed_row_policy, \
+                           join_storage_level = args.join_storage_level, \
+                           legacy_crash_id_joins = args.legacy_crash_id_joins, \
+                           broadcast_threshold_bytes = args.broadcast_threshold, \
+                           adaptive_skew_join = not args.no_skew_join, \
+                           approximate = args.approximate, \
+                           approximate_distinct_error = args.approximate_distinct_error, \
+                           approximate_top_n_error = args.approximate_top_n_error, \
+                           execution_mode = args.execution_mode, \
+                           max_concurrent_analyses = args.max_concurrent_analyses, \
+                           fair_scheduler_allocation_file = args.fair_scheduler_file, \
+                           compare_execution_modes = args.compare_execution_modes, \
+                           instrumentation = not args.no_instrumentation, \
+                           incremental = args.incremental, \
+                           batch_filePath = args.batch_path, \
+                           state_filePath = args.state_path)
+    from crashes.runner import runAnalyses
+    runAnalyses(config, specs)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
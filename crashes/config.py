@@ -0,0 +1,111 @@
+# Settings of a crashes analytics run
+## This module does not import pyspark so that the command line can be parsed before spark is loaded.
+from dataclasses import dataclass
+from typing import Optional
+import os
+
+malformed_row_policies = ("PERMISSIVE", "DROPMALFORMED", "FAILFAST")
+execution_modes = ("sequential", "concurrent")
+## Names of the pyspark StorageLevel constants a shared join view can be persisted with
+join_storage_levels = ("MEMORY_ONLY", "MEMORY_ONLY_2", "MEMORY_AND_DISK", "MEMORY_AND_DISK_2", "MEMORY_AND_DISK_DESER", \
+                       "DISK_ONLY", "DISK_ONLY_2", "DISK_ONLY_3", "OFF_HEAP")
+
+
+@dataclass
+class CrashesConfig:
+    # Spark settings
+    app_name: str = "crashes"
+    master: str = "local[*]"
+    ## Interval at which executors sample their memory (e.g. "100ms"), reported as the peak executor memory of each stage; off if None
+    executor_metrics_polling_interval: Optional[str] = None
+
+    # File paths (relative to the working directory); the csv file of a table is <data_filePath>/<table name>_use.csv
+    data_filePath: str = "./Data"
+    result_filePath: str = "./Alaytics_Results"
+
+    # Parquet ingestion settings
+    ## When enabled, every csv file is converted once to a typed and compressed parquet dataset which the analyses read instead of the csv.
+    ## A dataset is rebuilt only when the checksum of its source csv (or its schema) changes; the checksum is only recomputed
+    ## when the size or modification time of the csv changes.
+    use_parquet: bool = True
+    parquet_filePath: Optional[str] = None    # defaults to <data_filePath>/Parquet
+    parquet_compression: str = "snappy"
+    ## Size of csv written to each parquet file: a dataset gets one file per parquet_csv_bytes_per_file of its csv (at least one).
+    ## The snappy parquet of these tables is about 10 times smaller than their csv, so 1 GiB of csv makes files of about 100 MB.
+    parquet_csv_bytes_per_file: int = 1024 * 1024 * 1024
+    source_checksum_fileName: str = "_SOURCE_CHECKSUM.json"
+
+    # Schema validation settings
+    ## Policy for rows that do not match the schema of their table:
+    ## "PERMISSIVE" keeps them with the unparseable fields set to null, "DROPMALFORMED" drops them and "FAILFAST" stops the run
+    malformed_row_policy: str = "PERMISSIVE"
+    corrupt_record_column: str = "_corrupt_record"
+
+    # Shared join settings
+    ## Storage level (one of join_storage_levels) of the joined views shared by several analyses
+    join_storage_level: str = "MEMORY_AND_DISK"
+    ## Join units, persons and charges on their natural keys (CRASH_ID + UNIT_NBR, plus PRSN_NBR between charges and persons).
+    ## True restores the original joins on CRASH_ID alone, which pair every person, unit and charge of a crash with each other.
+    legacy_crash_id_joins: bool = False
+
+    # Approximate mode settings
+    ## Exploratory runs on very large inputs, trading exact results for bounded errors. Not available for incremental runs,
+    ## which merge exact aggregates.
+    ## The distinct CRASH_ID counts of analyses 1, 2 and 7 are HyperLogLog++ estimates (approx_count_distinct) with a relative
+    ## standard deviation of approximate_distinct_error.
+    ## Groupings of which the analyses only use the top N keys (see crashes.groupings) are counted on a random sample of their
+    ## rows, drawn in the same pass as their aggregation, and scaled back: the share of the rows counted for any key has a standard
+    ## error of at most approximate_top_n_error, so the top N keys are exact when their shares are further apart than a few times it.
+    approximate: bool = False
+    approximate_distinct_error: float = 0.02
+    approximate_top_n_error: float = 0.001
+
+    # Join strategy settings
+    ## Threshold of spark's automatic broadcast of join sides, planned from the statistics of their tables (e.g. Damages in
+    ## analysis 7) and re-planned from the actual shuffle sizes during adaptive execution; 0 disables it (the top-N lists of
+    ## analysis 8, a few rows by construction, are always broadcast).
+    broadcast_threshold_bytes: int = 64 * 1024 * 1024
+    ## Adaptive skew join handling: a join partition larger than skew_partition_factor times the median partition size and than
+    ## skew_partition_threshold (e.g. the rows of a pile-up CRASH_ID) is split into tasks of about advisory_partition_size.
+    adaptive_skew_join: bool = True
+    skew_partition_factor: float = 3.0
+    skew_partition_threshold: str = "64MB"
+    advisory_partition_size: str = "32MB"
+
+    # Execution settings
+    ## "sequential" runs the analyses one after another; "concurrent" submits them from a pool of driver threads,
+    ## each analysis in its own FAIR scheduler pool so that small aggregations use the cores left idle by the others.
+    execution_mode: str = "sequential"
+    max_concurrent_analyses: int = 4
+    ## Optional FAIR scheduler allocation file (weights and minimum shares of the pools); pools default to weight 1 otherwise
+    fair_scheduler_allocation_file: Optional[str] = None
+    ## Run the analyses sequentially and then concurrently, and report the wall-clock time of both runs
+    compare_execution_modes: bool = False
+
+    # Instrumentation settings
+    ## When enabled, the jobs of every analysis run in their own job group and its stage timings, task skew, shuffle volumes
+    ## and query plans are written as JSON to <result_filePath>/<metrics_fileName>; incremental runs report every analysis
+    ## for every batch applied. Metrics that cannot be collected (e.g. spark UI disabled) only produce a warning.
+    instrumentation: bool = True
+    metrics_fileName: str = "Analysis_Metrics.json"
+
+    # Incremental processing settings
+    ## When enabled, partial aggregates of every analysis are persisted in the state directory and only the crashes of new
+    ## batches (sub-directories of the batch directory holding <table name>_use.csv files) are aggregated and merged into them.
+    ## The first incremental run applies the inputs of the data directory as the initial "history" batch.
+    incremental: bool = False
+    batch_filePath: Optional[str] = None    # defaults to <data_filePath>/Batches
+    state_filePath: Optional[str] = None    # defaults to <data_filePath>/State
+    state_manifest_fileName: str = "_STATE_MANIFEST.json"
+
+    def csvFilePath(self, tableName):
+        return os.path.join(self.data_filePath, f"{tableName}_use.csv")
+
+    def parquetPath(self, tableName):
+        return os.path.join(self.parquet_filePath or os.path.join(self.data_filePath, "Parquet"), tableName)
+
+    def batchPath(self):
+        return self.batch_filePath or os.path.join(self.data_filePath, "Batches")
+
+    def statePath(self):
+        return self.state_filePath or os.path.join(self.data_filePath, "State")
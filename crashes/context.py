@@ -0,0 +1,34 @@
+# Context passed to the analyses: the spark session, the loaded tables, the shared join views and the shared groupings of a run
+from pyspark.sql.functions import approx_count_distinct
+
+from crashes.registry import crash_count_column
+
+class AnalysisContext:
+    def __init__(self, spark, config, tables, joinViews, groupings):
+        self.spark = spark
+        self.config = config
+        self.tables = tables
+        self.join_views = joinViews
+        self.groupings = groupings
+
+    ## Get a loaded table (only the tables and columns declared by the selected analyses are loaded)
+    def table(self, tableName):
+        if tableName not in self.tables:
+            raise KeyError(f"Table {tableName} is not declared by any of the selected analyses")
+        return self.tables[tableName]
+
+    ## Get a shared join view
+    def view(self, viewName):
+        return self.join_views.get(viewName)
+
+    ## Get a shared grouping
+    def grouping(self, groupingName):
+        return self.groupings.get(groupingName)
+
+    ## Set of the distinct CRASH_IDs of a DataFrame, as a partial aggregate
+    ## Approximate runs only keep its HyperLogLog++ estimated count, already counted (see crashes.registry.crash_count_column).
+    def crashIds(self, inputDataFrame):
+        if self.config.approximate:
+            return inputDataFrame.agg(approx_count_distinct("CRASH_ID", self.config.approximate_distinct_error).alias(crash_count_column))
+        return inputDataFrame.select("CRASH_ID") \
+                             .distinct()
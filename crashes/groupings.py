@@ -0,0 +1,200 @@
+# Shared groupings
+## Several analyses group the same source (e.g. units by make and by colour). Instead of scanning and shuffling the source
+## once per analysis, all groupings of a source used by the selected analyses are computed by a single aggregation over it,
+## whose few rows are collected to the driver; each grouping is rolled up from them there, without another spark job, and
+## handed to its analyses as a local relation (a VALUES query: createDataFrame would run a python worker job for every query
+## reading it).
+## Only groupings with few keys are declared as shared groupings (see crashes.registry): the combined result has a row per
+## combination of their keys, so a grouping with about a key per row (e.g. the crashes of the units matching a condition)
+## would make it as large as its source.
+##
+## Each grouping gets a boolean flag column (its where condition). The source is aggregated once by all flags and all keys
+## of its groupings, with the partial measures of every grouping; the rows of a grouping are the combined rows where its flag
+## is true, aggregated again by its own keys. Unlike GROUPING SETS, this does not expand every row of the source once per grouping.
+##
+## Approximate mode, for exploratory runs on very large inputs: groupings of which the analyses only use the top N keys are
+## counted on a random sample of their rows, taken in the same pass, and their counts and sums scaled back to all rows.
+## The sampled fraction f of a source is the smallest keeping the standard error of the share of the rows counted for any
+## key, sqrt(p (1 - f) / (f n)) for a key holding a share p of the n rows of the source, under approximate_top_n_error.
+## It depends on n, so the rows of the source are counted first (from the parquet footers for a table).
+import math
+import threading
+
+from pyspark.sql.functions import coalesce, expr, lit, rand
+from pyspark.sql.types import LongType, StructField, StructType
+
+from crashes.registry import grouping_specs
+
+## Seed of the row sample of approximate groupings, so that an approximate run can be repeated
+approximate_sample_seed = 42
+
+
+class SharedGroupings:
+    def __init__(self, config, tables, joinViews, sourceGroupings, consumers):
+        self.config = config
+        self.tables = tables
+        self.join_views = joinViews
+        self.source_groupings = sourceGroupings
+        # Analyses that still have to use the groupings of each source
+        self.consumers = {source : set(analysis_numbers) for source, analysis_numbers in consumers.items()}
+        # Rolled up groupings of each shared source, by grouping name
+        self.groupings = {}
+        self.sample_fractions = {}
+        self.lock = threading.Lock()
+        self.build_locks = {source : threading.RLock() for source in sourceGroupings}
+
+    ## Table or shared view a grouping is computed from
+    def sourceDataFrame(self, source):
+        if source in self.tables:
+            return self.tables[source]
+        return self.join_views.get(source)
+
+    ## Whether the groupings of a source are computed together (a source with a single grouping has nothing to share)
+    def sharedSource(self, source):
+        return len(self.source_groupings[source]) > 1
+
+    ## Fraction of the rows of the source of a grouping it is counted on: 1 unless it is sampled
+    ## The fraction is computed once per source, from its number of rows (see samplingFraction).
+    def groupingFraction(self, groupingName):
+        grouping_spec = grouping_specs[groupingName]
+        if not sampledGrouping(grouping_spec, self.config):
+            return 1.0
+        with self.build_locks[grouping_spec.source]:
+            if grouping_spec.source not in self.sample_fractions:
+                self.sample_fractions[grouping_spec.source] = samplingFraction(self.config.approximate_top_n_error, self.sourceDataFrame(grouping_spec.source).count())
+            return self.sample_fractions[grouping_spec.source]
+
+    ## Compute all groupings of a source in one aggregation and roll each of them up from its rows, on the driver
+    def build(self, source):
+        grouping_names = self.source_groupings[source]
+        source_df = self.sourceDataFrame(source)
+        flag_columns = []
+        source_columns = []
+        for index, grouping_name in enumerate(grouping_names):
+            grouping_spec = grouping_specs[grouping_name]
+            flag = coalesce(expr(grouping_spec.where), lit(False)) if grouping_spec.where else lit(True)
+            if self.groupingFraction(grouping_name) < 1:
+                flag = flag & (rand(approximate_sample_seed) < self.groupingFraction(grouping_name))
+            flag_columns.append(flag.alias(f"_f{index}"))
+            source_columns.extend(grouping_spec.keys)
+            source_columns.extend(column for _, column in grouping_spec.measures.values() if column != "*")
+        flagged_df = source_df.select(*flag_columns, *dict.fromkeys(source_columns))
+        combined_df = source_df.sparkSession.sql(combinedGroupingQuery(grouping_names), source = flagged_df)
+        combined_rows = combined_df.collect()
+        groupings = {}
+        for index, grouping_name in enumerate(grouping_names):
+            grouping_spec = grouping_specs[grouping_name]
+            sample_fraction = self.groupingFraction(grouping_name)
+            # Same columns and types as the aggregation of the grouping on its own (see singleGrouping)
+            schema = StructType([combined_df.schema[key_column] for key_column in grouping_spec.keys] + \
+                                [StructField(measure_name, LongType() if sample_fraction < 1 else combined_df.schema[f"_m{index}_{measure_name}"].dataType, True) \
+                                 for measure_name in grouping_spec.measures])
+            groupings[grouping_name] = localDataFrame(source_df.sparkSession, rolledUpRows(combined_rows, index, grouping_spec, sample_fraction), schema)
+        return groupings
+
+    ## Get the rows of a grouping: its keys and measures
+    ## A grouping that is not shared is aggregated on its own, as part of the query of its analysis.
+    def get(self, groupingName):
+        source = grouping_specs[groupingName].source
+        if not self.sharedSource(source):
+            return singleGrouping(self.sourceDataFrame(source), groupingName, self.groupingFraction(groupingName))
+        with self.build_locks[source]:
+            if source not in self.groupings:
+                groupings = self.build(source)
+                with self.lock:
+                    self.groupings[source] = groupings
+            return self.groupings[source][groupingName]
+
+    ## Drop the groupings no longer needed once an analysis has finished
+    def release(self, analysisNumber):
+        with self.lock:
+            for source, consumers in self.consumers.items():
+                consumers.discard(analysisNumber)
+                if not consumers:
+                    self.groupings.pop(source, None)
+        return None
+
+
+## Whether a grouping is counted on a sample of its rows: in approximate runs, the groupings of which the analyses only use the top N keys
+def sampledGrouping(groupingSpec, config):
+    return config.approximate and groupingSpec.top_n is not None
+
+## Smallest fraction of the rows of a source keeping the standard error of the share of the rows counted for any key under
+## the given error: sqrt((1 - f) / (f n)) <= error for a key holding all rows, so f = 1 / (1 + error^2 n)
+def samplingFraction(error, rowCount):
+    return 1 / (1 + error ** 2 * rowCount)
+
+## SQL aggregate of a measure
+def measureExpression(function, column):
+    if function == "sum":
+        return f"sum(`{column}`)"
+    if function == "count":
+        return "count(*)" if column == "*" else f"count(`{column}`)"
+    raise ValueError(f"Unknown grouping measure function: {function}")
+
+## SQL measure of a grouping, scaled from the sampled fraction of its rows to all rows
+def scaledMeasure(measure, sampleFraction):
+    if sampleFraction < 1:
+        return f"CAST(round({measure} / {sampleFraction}) AS BIGINT)"
+    return measure
+
+## Value of a measure scaled from the sampled fraction of its rows to all rows, rounded half up like scaledMeasure
+def scaledValue(value, sampleFraction):
+    if sampleFraction < 1 and value is not None:
+        return math.floor(value / sampleFraction + 0.5)
+    return value
+
+## Aggregation of a grouping on its own: a plain filter and aggregation of its source
+def singleGrouping(sourceDataFrame, groupingName, sampleFraction):
+    grouping_spec = grouping_specs[groupingName]
+    grouping_df = sourceDataFrame.where(expr(grouping_spec.where)) if grouping_spec.where else sourceDataFrame
+    if sampleFraction < 1:
+        grouping_df = grouping_df.where(rand(approximate_sample_seed) < sampleFraction)
+    return grouping_df.groupBy(*grouping_spec.keys) \
+                      .agg(*[expr(scaledMeasure(measureExpression(function, column), sampleFraction)).alias(measure_name) \
+                             for measure_name, (function, column) in grouping_spec.measures.items()])
+
+## Query aggregating the {source} DataFrame, which has the flag columns _f<index> of the given groupings and the columns of
+## their keys and measures, by all flags and keys; the partial measures of each grouping are named _m<index>_<measure name>
+## and are summed when its rows are rolled up by its own keys.
+def combinedGroupingQuery(groupingNames):
+    group_columns = [f"_f{index}" for index in range(len(groupingNames))]
+    measure_columns = []
+    for index, grouping_name in enumerate(groupingNames):
+        grouping_spec = grouping_specs[grouping_name]
+        group_columns.extend(f"`{key_column}`" for key_column in grouping_spec.keys if f"`{key_column}`" not in group_columns)
+        measure_columns.extend(f"{measureExpression(function, column)} AS `_m{index}_{measure_name}`" for measure_name, (function, column) in grouping_spec.measures.items())
+    return f"SELECT {', '.join(group_columns + measure_columns)} FROM {{source}} GROUP BY {', '.join(group_columns)}"
+
+## Rows (keys, then measures) of the grouping of the given index rolled up from the rows of the combined query: the rows
+## where its flag is set, with their partial measures summed by its keys and scaled to all rows if the grouping is sampled
+## Sums of null partial measures stay null, like a sum aggregate over null values.
+def rolledUpRows(combinedRows, index, groupingSpec, sampleFraction):
+    measures = {}
+    for combined_row in combinedRows:
+        if not combined_row[f"_f{index}"]:
+            continue
+        key = tuple(combined_row[key_column] for key_column in groupingSpec.keys)
+        partial_measures = [combined_row[f"_m{index}_{measure_name}"] for measure_name in groupingSpec.measures]
+        if key not in measures:
+            measures[key] = partial_measures
+        else:
+            measures[key] = [total if partial is None else partial if total is None else total + partial for total, partial in zip(measures[key], partial_measures)]
+    return [key + tuple(scaledValue(measure, sampleFraction) for measure in key_measures) for key, key_measures in measures.items()]
+
+## SQL literal of a value of the given type
+def sqlLiteral(value, dataType):
+    if value is None:
+        return f"CAST(NULL AS {dataType.simpleString()})"
+    text = str(value).replace("\\", "\\\\").replace("'", "\\'")
+    return f"CAST('{text}' AS {dataType.simpleString()})"
+
+## Query of a VALUES relation holding the given rows (no rows keeps a row of nulls out)
+def valuesQuery(rows, schema):
+    values = ", ".join(f"({', '.join(sqlLiteral(value, field.dataType) for value, field in zip(row, schema.fields))})" for row in rows or [[None] * len(schema.fields)])
+    query = f"SELECT * FROM VALUES {values} AS grouping_rows({', '.join(f'`{field.name}`' for field in schema.fields)})"
+    return query if rows else f"{query} WHERE false"
+
+## DataFrame of rows held by the driver, planned by spark as a local relation
+def localDataFrame(spark, rows, schema):
+    return spark.sql(valuesQuery(rows, schema))
@@ -0,0 +1,256 @@
+# Incremental processing
+## The partial aggregates of every analysis (see crashes.analyses) are persisted in the state directory. A run only reads
+## the crashes of the batches not applied yet, aggregates them and merges them into the persisted aggregates; the results
+## are then derived from the merged aggregates. Run time therefore follows the size of the new batches, not of the history.
+##
+## Batches are append-only: a crash must arrive complete in a single batch. Rows of crashes already applied are ignored,
+## and a batch whose files changed after it was applied stops the run (the state has to be rebuilt from scratch). Files of
+## applied batches are only hashed again when their size or modification time changed, and the CRASH_IDs of a new batch are
+## only looked up in the processed CRASH_IDs of the batches whose CRASH_ID range overlaps its own.
+## The settings the aggregates depend on (join keys, malformed row policy) are recorded with the state: a run with other
+## settings stops instead of merging aggregates that do not count the same rows.
+##
+## State layout: <state>/<aggregate name>/<batch name> parquet datasets and the manifest listing the applied batches and
+## the datasets making up each aggregate, with the CRASH_ID range of each batch. Sets of CRASH_IDs (aggregates without measures) get one dataset per batch, as the
+## crashes of different batches are disjoint, and the manifest keeps their running number of CRASH_IDs: results counting a
+## set are derived from that number instead of reading the datasets of every batch. Counts and sums are rewritten merged for
+## every batch, which is cheap as they only have a row per key. The manifest is replaced last, so a failed run leaves the
+## previous state untouched.
+from dataclasses import replace
+import json
+import os
+import shutil
+import time
+
+from pyspark.sql.functions import col, max, min, sum
+
+from crashes.context import AnalysisContext
+from crashes.groupings import SharedGroupings
+from crashes.ingest import fileFingerprint, readCrashTable
+from crashes.joins import JoinViews
+from crashes.metrics import analysisJobGroup
+from crashes.registry import analysis_specs, crash_count_column, requiredColumns, viewConsumers, sourceGroupings, groupingConsumers, loadAnalysisFunctions
+from crashes.schemas import table_schemas
+
+history_batch_name = "history"
+processed_crash_ids_name = "processed_crash_ids"
+processed_crash_id_ranges_name = "processed_crash_id_ranges"
+crash_id_counts_name = "crash_id_counts"
+## Settings the persisted aggregates depend on
+state_setting_names = ("legacy_crash_id_joins", "malformed_row_policy")
+
+
+## Manifest of the state (empty state if no batch was applied yet)
+def readStateManifest(config):
+    manifestFile = os.path.join(config.statePath(), config.state_manifest_fileName)
+    if not os.path.exists(manifestFile):
+        return {"settings" : stateSettings(config), "batches" : [], "aggregates" : {}, crash_id_counts_name : {}, \
+                processed_crash_ids_name : [], processed_crash_id_ranges_name : {}}
+    with open(manifestFile) as inputFile:
+        return json.load(inputFile)
+
+## Replace the manifest of the state in a single step
+def writeStateManifest(config, manifest):
+    manifestFile = os.path.join(config.statePath(), config.state_manifest_fileName)
+    with open(manifestFile + ".tmp", "w") as outputFile:
+        json.dump(manifest, outputFile, indent = 2)
+    os.replace(manifestFile + ".tmp", manifestFile)
+    return None
+
+## Settings of a run the persisted aggregates depend on
+def stateSettings(config):
+    return {setting_name : getattr(config, setting_name) for setting_name in state_setting_names}
+
+## Stop a run whose settings differ from the ones the state was built with (an empty state takes the settings of the run)
+def checkStateSettings(config, manifest):
+    if manifest["batches"] and manifest["settings"] != stateSettings(config):
+        raise ValueError(f"The state was built with {manifest['settings']}, not {stateSettings(config)}; run with the same settings or rebuild the state from scratch")
+    return None
+
+## Fingerprints (size, modification time and checksum) of the csv files of a batch
+## The checksums of the recorded fingerprints of an applied batch are reused for the files whose size and modification time did not change.
+def batchChecksums(batchConfig, tableNames, recordedChecksums = None):
+    checksums = {}
+    for table_name in tableNames:
+        csvFilePath = batchConfig.csvFilePath(table_name)
+        if not os.path.exists(csvFilePath):
+            raise FileNotFoundError(f"Batch file {csvFilePath} is missing")
+        checksums[table_name] = fileFingerprint(csvFilePath, (recordedChecksums or {}).get(table_name))
+    return checksums
+
+## Batches not applied yet, in name order, as (name, config reading the batch, checksums of its files), and whether the
+## fingerprints of applied batches were refreshed in the manifest (files with new modification times but the same contents)
+## The data directory is the first batch of an empty state; batch directories are read as csv without a parquet copy.
+def pendingBatches(config, manifest, tableNames):
+    applied_batches = {batch["name"] : batch for batch in manifest["batches"]}
+    batches = []
+    refreshed = False
+    if not applied_batches:
+        batches.append((history_batch_name, config, batchChecksums(config, tableNames)))
+    batch_directories = sorted(os.listdir(config.batchPath())) if os.path.isdir(config.batchPath()) else []
+    for batch_name in batch_directories:
+        if batch_name == history_batch_name or not os.path.isdir(os.path.join(config.batchPath(), batch_name)):
+            continue
+        batch_config = replace(config, data_filePath = os.path.join(config.batchPath(), batch_name), use_parquet = False)
+        if batch_name in applied_batches:
+            recorded_checksums = applied_batches[batch_name]["checksums"]
+            checksums = batchChecksums(batch_config, tableNames, recorded_checksums)
+            if {table_name : fingerprint["sha256"] for table_name, fingerprint in checksums.items()} \
+               != {table_name : fingerprint["sha256"] for table_name, fingerprint in recorded_checksums.items()}:
+                raise ValueError(f"Batch {batch_name} changed after it was applied; rebuild the state from scratch")
+            if recorded_checksums != checksums:
+                applied_batches[batch_name]["checksums"] = checksums
+                refreshed = True
+            continue
+        batches.append((batch_name, batch_config, batchChecksums(batch_config, tableNames)))
+    return batches, refreshed
+
+## Whether a recorded CRASH_ID range ([None, None] for a batch without crashes) overlaps another one
+def crashIdRangesOverlap(recordedRange, crashIdRange):
+    if recordedRange[0] is None or crashIdRange[0] is None:
+        return False
+    return recordedRange[0] <= crashIdRange[1] and crashIdRange[0] <= recordedRange[1]
+
+## Read persisted datasets of the state as one DataFrame
+def readStateDatasets(spark, config, datasetNames):
+    return spark.read.parquet(*[os.path.join(config.statePath(), dataset_name) for dataset_name in datasetNames])
+
+## Datasets making up an aggregate once the dataset written for a batch is merged into it
+## Sets of CRASH_IDs get the dataset of the batch added; counts and sums are replaced by the merged dataset of the batch.
+def mergedDatasetNames(aggregateSpec, datasetNames, datasetName):
+    if not aggregateSpec.measures:
+        return datasetNames + [datasetName]
+    return [datasetName]
+
+## Datasets of a manifest no longer referenced by the manifest replacing it
+def unreferencedDatasets(manifest, newManifest):
+    referenced_datasets = {dataset_name for dataset_names in newManifest["aggregates"].values() for dataset_name in dataset_names}
+    return [dataset_name for dataset_names in manifest["aggregates"].values() for dataset_name in dataset_names if dataset_name not in referenced_datasets]
+
+## Merge the aggregate of a batch into the persisted one; returns the datasets making up the merged aggregate
+def mergeAggregate(spark, config, aggregateName, aggregateSpec, datasetNames, batchAggregate, batchName):
+    dataset_name = f"{aggregateName}/{batchName}"
+    merged_aggregate = batchAggregate
+    if aggregateSpec.measures and datasetNames:
+        merged_aggregate = readStateDatasets(spark, config, datasetNames).unionByName(batchAggregate) \
+                                                                         .groupBy(*aggregateSpec.keys) \
+                                                                         .agg(*[sum(col(measure)).alias(measure) for measure in aggregateSpec.measures])
+    merged_aggregate.coalesce(1) \
+                    .write.mode("overwrite") \
+                    .parquet(os.path.join(config.statePath(), dataset_name))
+    return mergedDatasetNames(aggregateSpec, datasetNames, dataset_name)
+
+## Aggregate the crashes of a batch that are not in the state yet and merge them into the state
+## The jobs reading the batch and its CRASH_IDs and the jobs of every analysis run in their own job groups.
+## Returns the new manifest, the number of new crashes of the batch and the (batch, analysis spec or None for the reading of
+## the batch, job group, wall-clock seconds) row of every job group.
+def applyBatch(spark, config, manifest, batchName, batchConfig, checksums, rejectedRowCounts):
+    sc = spark.sparkContext
+    batch_job_group = analysisJobGroup(None, "incremental", batchName)
+    sc.setJobGroup(batch_job_group, f"Batch {batchName}")
+    start_time = time.perf_counter()
+    columns = requiredColumns(analysis_specs)
+    tables = {}
+    for table_name in table_schemas:
+        if table_name in columns:
+            batch_rejected_row_counts = {}
+            tables[table_name] = readCrashTable(spark, batchConfig, table_name, columns[table_name] | {"CRASH_ID"}, batch_rejected_row_counts)
+            rejectedRowCounts[table_name] = rejectedRowCounts.get(table_name, 0) + batch_rejected_row_counts[table_name]
+    batch_crash_ids = None
+    for table_df in tables.values():
+        table_crash_ids = table_df.select("CRASH_ID")
+        batch_crash_ids = table_crash_ids if batch_crash_ids is None else batch_crash_ids.unionByName(table_crash_ids)
+    batch_crash_ids = batch_crash_ids.distinct().cache()
+    crash_id_range = list(batch_crash_ids.agg(min("CRASH_ID"), max("CRASH_ID")).first())
+    # Crashes already applied are looked up among the processed CRASH_IDs of the batches overlapping the range of the batch only
+    crash_id_ranges = manifest[processed_crash_id_ranges_name]
+    overlapping_datasets = [dataset_name for dataset_name in manifest[processed_crash_ids_name] if crashIdRangesOverlap(crash_id_ranges[dataset_name], crash_id_range)]
+    repeated_crash_ids = None
+    if overlapping_datasets:
+        repeated_crash_ids = readStateDatasets(spark, config, overlapping_datasets).where(col("CRASH_ID").between(*crash_id_range)) \
+                                                                                   .join(batch_crash_ids, on = ["CRASH_ID"], how = "left_semi") \
+                                                                                   .cache()
+        tables = {table_name : table_df.join(repeated_crash_ids, on = ["CRASH_ID"], how = "left_anti") for table_name, table_df in tables.items()}
+        new_crash_ids = batch_crash_ids.join(repeated_crash_ids, on = ["CRASH_ID"], how = "left_anti").cache()
+    else:
+        new_crash_ids = batch_crash_ids
+
+    new_manifest = {"settings" : stateSettings(config), "batches" : list(manifest["batches"]), "aggregates" : dict(manifest["aggregates"]), \
+                    crash_id_counts_name : dict(manifest[crash_id_counts_name])}
+    join_views = JoinViews(config, tables, viewConsumers(analysis_specs))
+    groupings = SharedGroupings(batchConfig, tables, join_views, sourceGroupings(analysis_specs), groupingConsumers(analysis_specs))
+    ctx = AnalysisContext(spark, config, tables, join_views, groupings)
+    batch_time = time.perf_counter() - start_time
+    analysis_runs = []
+    for spec in analysis_specs:
+        job_group = analysisJobGroup(spec, "incremental", batchName)
+        sc.setJobGroup(job_group, f"Batch {batchName}, analysis {spec.number}: {spec.name}")
+        analysis_start_time = time.perf_counter()
+        aggregate, _ = loadAnalysisFunctions(spec)
+        batch_aggregates = aggregate(ctx)
+        for aggregate_name, aggregate_spec in spec.aggregates.items():
+            new_manifest["aggregates"][aggregate_name] = mergeAggregate(spark, config, aggregate_name, aggregate_spec, manifest["aggregates"].get(aggregate_name, []), batch_aggregates[aggregate_name], batchName)
+            if not aggregate_spec.measures:
+                # Counted from the footers of the dataset just written for the batch
+                new_manifest[crash_id_counts_name][aggregate_name] = manifest[crash_id_counts_name].get(aggregate_name, 0) \
+                                                                     + readStateDatasets(spark, config, new_manifest["aggregates"][aggregate_name][-1:]).count()
+        groupings.release(spec.number)
+        join_views.release(spec.number)
+        analysis_runs.append((batchName, spec, job_group, time.perf_counter() - analysis_start_time))
+    sc.setJobGroup(batch_job_group, f"Batch {batchName}")
+    batch_start_time = time.perf_counter()
+    new_crash_count = new_crash_ids.count()
+    # Sorted so that the parquet statistics let the CRASH_ID range filter of the next batches skip row groups
+    new_crash_ids.coalesce(1) \
+                 .sortWithinPartitions("CRASH_ID") \
+                 .write.mode("overwrite") \
+                 .parquet(os.path.join(config.statePath(), processed_crash_ids_name, batchName))
+    for crash_ids in (new_crash_ids, repeated_crash_ids, batch_crash_ids):
+        if crash_ids is not None:
+            crash_ids.unpersist()
+    new_manifest[processed_crash_ids_name] = manifest[processed_crash_ids_name] + [f"{processed_crash_ids_name}/{batchName}"]
+    new_manifest[processed_crash_id_ranges_name] = {**crash_id_ranges, f"{processed_crash_ids_name}/{batchName}" : crash_id_range}
+    new_manifest["batches"].append({"name" : batchName, "checksums" : checksums, "new_crashes" : new_crash_count})
+    analysis_runs.insert(0, (batchName, None, batch_job_group, batch_time + time.perf_counter() - batch_start_time))
+    return new_manifest, new_crash_count, analysis_runs
+
+## Set of CRASH_IDs of the state, given already counted (see crashes.analyses.crashIdCount)
+def countedCrashIds(spark, manifest, aggregateName):
+    return spark.createDataFrame([(manifest[crash_id_counts_name][aggregateName],)], f"{crash_count_column} bigint")
+
+## Apply the pending batches to the state and derive the results of the given analyses from it
+## Returns the (description, result) row of every analysis, the (batch, new crashes) row of every batch applied and the
+## (batch, analysis spec, job group, wall-clock seconds) row of every job group run (batch None for deriving the results).
+def runIncremental(spark, config, specs, rejectedRowCounts):
+    if config.approximate:
+        raise ValueError("Approximate aggregates cannot be merged into the state of incremental runs")
+    os.makedirs(config.statePath(), exist_ok = True)
+    manifest = readStateManifest(config)
+    checkStateSettings(config, manifest)
+    batches, refreshed = pendingBatches(config, manifest, list(requiredColumns(analysis_specs)))
+    if refreshed:
+        writeStateManifest(config, manifest)
+    batch_rows = []
+    analysis_runs = []
+    for batch_name, batch_config, checksums in batches:
+        new_manifest, new_crash_count, batch_analysis_runs = applyBatch(spark, config, manifest, batch_name, batch_config, checksums, rejectedRowCounts)
+        writeStateManifest(config, new_manifest)
+        # Merged counts and sums replaced by the new batch are no longer referenced by the manifest
+        for dataset_name in unreferencedDatasets(manifest, new_manifest):
+            shutil.rmtree(os.path.join(config.statePath(), dataset_name), ignore_errors = True)
+        manifest = new_manifest
+        batch_rows.append((batch_name, new_crash_count))
+        analysis_runs.extend(batch_analysis_runs)
+    result_rows = []
+    for spec in specs:
+        job_group = analysisJobGroup(spec, "incremental")
+        spark.sparkContext.setJobGroup(job_group, f"Analysis {spec.number}: {spec.name}")
+        start_time = time.perf_counter()
+        _, derive_result = loadAnalysisFunctions(spec)
+        aggregates = {aggregate_name : readStateDatasets(spark, config, manifest["aggregates"][aggregate_name]) if aggregate_spec.measures \
+                                       else countedCrashIds(spark, manifest, aggregate_name) \
+                      for aggregate_name, aggregate_spec in spec.aggregates.items()}
+        result_rows.append((spec.description, derive_result(aggregates)))
+        analysis_runs.append((None, spec, job_group, time.perf_counter() - start_time))
+    spark.sparkContext.setJobGroup(None, None)
+    return result_rows, batch_rows, analysis_runs
@@ -0,0 +1,126 @@
+# Reading of the input tables: schema enforcement, malformed row policy and parquet ingestion
+from pyspark.sql.functions import col, count, struct, when
+from pyspark.sql.types import StructType, StructField, StringType
+import hashlib
+import json
+import math
+import os
+
+from crashes.config import malformed_row_policies
+from crashes.schemas import table_schemas
+
+
+## Read a csv file with its schema enforced; rows that do not match it keep their raw text in the corrupt record column
+def readCSVtoDF(spark, config, csvFilePath, schema):
+    return spark.read.option("header", True) \
+                     .option("mode", "PERMISSIVE") \
+                     .option("columnNameOfCorruptRecord", config.corrupt_record_column) \
+                     .schema(StructType(schema.fields + [StructField(config.corrupt_record_column, StringType(), True)])) \
+                     .csv(csvFilePath)
+
+## Checksum of a source file, read in blocks so that large extracts are not loaded in memory
+def fileChecksum(filePath, blockSize = 1024 * 1024):
+    checksum = hashlib.sha256()
+    with open(filePath, "rb") as sourceFile:
+        for block in iter(lambda: sourceFile.read(blockSize), b""):
+            checksum.update(block)
+    return checksum.hexdigest()
+
+## Size, modification time and checksum of a source file
+## The checksum of a previous fingerprint of the same file is reused as long as its size and modification time are unchanged,
+## so that unchanged extracts are not read again on every run.
+def fileFingerprint(filePath, recordedFingerprint = None):
+    file_stat = os.stat(filePath)
+    fingerprint = {"size" : file_stat.st_size, "mtime_ns" : file_stat.st_mtime_ns}
+    if recordedFingerprint is not None \
+       and recordedFingerprint.get("size") == fingerprint["size"] \
+       and recordedFingerprint.get("mtime_ns") == fingerprint["mtime_ns"] \
+       and recordedFingerprint.get("sha256"):
+        fingerprint["sha256"] = recordedFingerprint["sha256"]
+    else:
+        fingerprint["sha256"] = fileChecksum(filePath)
+    return fingerprint
+
+## Checksum recorded with a parquet dataset (None if the dataset was never built or its build did not complete)
+def readSourceChecksum(config, parquetPath):
+    checksumFile = os.path.join(parquetPath, config.source_checksum_fileName)
+    if not os.path.exists(checksumFile):
+        return None
+    with open(checksumFile) as inputFile:
+        return json.load(inputFile)
+
+## Record the checksum of the source of a parquet dataset
+def writeSourceChecksum(config, parquetPath, sourceChecksum):
+    with open(os.path.join(parquetPath, config.source_checksum_fileName), "w") as outputFile:
+        json.dump(sourceChecksum, outputFile, indent = 2)
+    return None
+
+## Number of files of the parquet dataset of a csv file of the given size
+def parquetPartitions(config, csvFileSize):
+    return max(1, math.ceil(csvFileSize / config.parquet_csv_bytes_per_file))
+
+## Write a csv file to a parquet dataset clustered on CRASH_ID, unless the dataset is already built from the same csv
+## Rows are hash partitioned on CRASH_ID and sorted within each file, so every crash lives in a single file and
+## the parquet min/max statistics on CRASH_ID let filters on it skip row groups.
+## The number of files follows the size of the csv (see parquet_csv_bytes_per_file), so each sort stays bounded as the inputs grow.
+## The corrupt record column is kept in the dataset so that the malformed row policy can still be applied when reading it.
+## The checksum file is written last (files starting with "_" are ignored by the parquet reader) so that an interrupted build is redone.
+## The csv file is only hashed again when its size or modification time changed since the checksum was recorded.
+def ingestCSVtoParquet(spark, config, csvFilePath, schema, parquetPath):
+    recorded_checksum = readSourceChecksum(config, parquetPath)
+    recorded_fingerprint = recorded_checksum if recorded_checksum is not None and recorded_checksum.get("source_file") == os.path.abspath(csvFilePath) else None
+    source_checksum = {"source_file" : os.path.abspath(csvFilePath), \
+                       **fileFingerprint(csvFilePath, recorded_fingerprint), \
+                       "schema" : schema.json(), \
+                       "corrupt_record_column" : config.corrupt_record_column}
+    if recorded_checksum is not None \
+       and recorded_checksum["sha256"] == source_checksum["sha256"] \
+       and recorded_checksum["schema"] == source_checksum["schema"] \
+       and recorded_checksum.get("corrupt_record_column") == config.corrupt_record_column:
+        if recorded_checksum != source_checksum:
+            # Same contents with a new modification time (e.g. copied again): recorded so that the file is not hashed on the next run
+            writeSourceChecksum(config, parquetPath, source_checksum)
+        return False
+    readCSVtoDF(spark, config, csvFilePath, schema) \
+              .repartition(parquetPartitions(config, source_checksum["size"]), col("CRASH_ID")) \
+              .sortWithinPartitions("CRASH_ID") \
+              .write.mode("overwrite") \
+              .option("compression", config.parquet_compression) \
+              .parquet(parquetPath)
+    writeSourceChecksum(config, parquetPath, source_checksum)
+    return True
+
+## Count the rows of a table that do not match its schema and apply the malformed row policy to them
+## Spark only parses the csv fields a query reads: the rejected rows of a csv table are counted with all its columns
+## referenced (checkedColumns), so that every field is checked without caching the table.
+def applyMalformedRowPolicy(config, tableName, inputDataFrame, rejectedRowCounts, checkedColumns = ()):
+    if checkedColumns:
+        rejected_rows = inputDataFrame.select(count(when(col(config.corrupt_record_column).isNotNull(), struct(*checkedColumns)))) \
+                                      .first()[0]
+    else:
+        rejected_rows = inputDataFrame.where(col(config.corrupt_record_column).isNotNull()) \
+                                      .count()
+    rejectedRowCounts[tableName] = rejected_rows
+    if config.malformed_row_policy == "FAILFAST" and rejected_rows > 0:
+        raise ValueError(f"{rejected_rows} rows of {tableName} do not match its schema (malformed row policy is FAILFAST)")
+    if config.malformed_row_policy == "DROPMALFORMED":
+        inputDataFrame = inputDataFrame.where(col(config.corrupt_record_column).isNull())
+    return inputDataFrame.drop(config.corrupt_record_column)
+
+## Read a table from its parquet copy (building it first if needed) or directly from the csv file
+## Only the given columns are kept (all of them if None), so that parquet scans read nothing else.
+def readCrashTable(spark, config, tableName, columns, rejectedRowCounts):
+    if config.malformed_row_policy not in malformed_row_policies:
+        raise ValueError(f"Unknown malformed row policy: {config.malformed_row_policy}")
+    schema = table_schemas[tableName]
+    if config.use_parquet:
+        parquetPath = config.parquetPath(tableName)
+        ingestCSVtoParquet(spark, config, config.csvFilePath(tableName), schema, parquetPath)
+        table_df = applyMalformedRowPolicy(config, tableName, spark.read.parquet(parquetPath), rejectedRowCounts)
+    else:
+        # The csv file is parsed in full once to count its rejected rows; the analyses then only parse the columns they read
+        # (DROPMALFORMED drops the rows of which one of these columns does not parse)
+        table_df = applyMalformedRowPolicy(config, tableName, readCSVtoDF(spark, config, config.csvFilePath(tableName), schema), rejectedRowCounts, schema.fieldNames())
+    if columns is None:
+        return table_df
+    return table_df.select(*[column for column in schema.fieldNames() if column in columns])
@@ -0,0 +1,83 @@
+# Shared joins
+## Joins used by several analyses are built once, persisted and unpersisted when the last analysis using them has finished.
+## Each view keeps only the columns the analyses read from it, which keeps the persisted data and its shuffles small.
+## A persisted view is only hash partitioned on its own join keys: units_charges (CRASH_ID, UNIT_NBR), joined again with
+## Primary_Person on CRASH_ID, UNIT_NBR and PRSN_NBR for units_charges_person, is shuffled again on the three keys like
+## Primary_Person, unless Primary_Person is broadcast (see broadcast_threshold_bytes).
+## Views may be requested by several analyses running concurrently: each view is built under its own lock.
+from pyspark import StorageLevel
+import threading
+
+from crashes.config import join_storage_levels
+
+
+class JoinViews:
+    def __init__(self, config, tables, consumers):
+        self.config = config
+        self.tables = tables
+        # Analyses that still have to use each view
+        self.consumers = {view_name : set(analysis_numbers) for view_name, analysis_numbers in consumers.items()}
+        self.views = {}
+        self.cardinality = {}
+        self.lock = threading.Lock()
+        self.build_locks = {view_name : threading.Lock() for view_name in join_view_builders}
+
+    ## Join keys of a view: CRASH_ID plus the given unit/person level keys, or CRASH_ID alone in legacy mode
+    def joinKeys(self, *naturalKeys):
+        if self.config.legacy_crash_id_joins:
+            return ["CRASH_ID"]
+        return ["CRASH_ID"] + list(naturalKeys)
+
+    ## Get a shared view, building and persisting it on first use
+    ## Counting the rows of a new view materializes it in storage and records the intermediate cardinality of its join.
+    def get(self, viewName):
+        if self.config.join_storage_level not in join_storage_levels:
+            raise ValueError(f"Unknown join storage level: {self.config.join_storage_level}")
+        with self.build_locks[viewName]:
+            if viewName not in self.views:
+                join_view = join_view_builders[viewName](self).persist(getattr(StorageLevel, self.config.join_storage_level))
+                self.cardinality[viewName] = join_view.count()
+                with self.lock:
+                    self.views[viewName] = join_view
+            return self.views[viewName]
+
+    ## Unpersist the views no longer needed once an analysis has finished
+    def release(self, analysisNumber):
+        with self.lock:
+            for viewName, consumers in self.consumers.items():
+                consumers.discard(analysisNumber)
+                if not consumers and viewName in self.views:
+                    self.views.pop(viewName).unpersist()
+        return None
+
+    ## Rows produced by each view built so far, with its join keys
+    @property
+    def cardinality_rows(self):
+        return [(viewName, ", ".join(self.joinKeys(*join_view_natural_keys[viewName])), self.cardinality[viewName]) \
+                for viewName in join_view_builders if viewName in self.cardinality]
+
+
+def buildUnitsChargesView(joinViews):
+    units_df = joinViews.tables["Units"]
+    charges_df = joinViews.tables["Charges"]
+    return units_df.select(*joinViews.joinKeys("UNIT_NBR"), "VEH_BODY_STYL_ID", "VEH_COLOR_ID", "VEH_LIC_STATE_ID", "VEH_MAKE_ID") \
+                   .join(charges_df.select(*joinViews.joinKeys("UNIT_NBR", "PRSN_NBR"), "CHARGE"), on = joinViews.joinKeys("UNIT_NBR"), how = "inner")
+
+def buildPersonUnitsView(joinViews):
+    primary_person_df = joinViews.tables["Primary_Person"]
+    units_df = joinViews.tables["Units"]
+    return primary_person_df.select(*joinViews.joinKeys("UNIT_NBR"), "PRSN_ETHNICITY_ID", "DRVR_ZIP") \
+                            .join(units_df.select(*joinViews.joinKeys("UNIT_NBR"), "VEH_BODY_STYL_ID", "CONTRIB_FACTR_1_ID", "CONTRIB_FACTR_2_ID"), on = joinViews.joinKeys("UNIT_NBR"), how = "inner")
+
+def buildUnitsChargesPersonView(joinViews):
+    primary_person_df = joinViews.tables["Primary_Person"]
+    return joinViews.get("units_charges").join(primary_person_df.select(*joinViews.joinKeys("UNIT_NBR", "PRSN_NBR"), "DRVR_LIC_TYPE_ID"), on = joinViews.joinKeys("UNIT_NBR", "PRSN_NBR"), how = "inner")
+
+join_view_builders = {"units_charges" : buildUnitsChargesView, \
+                      "person_units" : buildPersonUnitsView, \
+                      "units_charges_person" : buildUnitsChargesPersonView}
+
+## Unit/person level keys each view is joined on, in addition to CRASH_ID
+join_view_natural_keys = {"units_charges" : ("UNIT_NBR",), \
+                          "person_units" : ("UNIT_NBR",), \
+                          "units_charges_person" : ("UNIT_NBR", "PRSN_NBR")}
@@ -0,0 +1,116 @@
+# Metrics of the spark jobs run by an analysis
+## The metrics are read from the status store of the running application through the monitoring REST API of the spark UI.
+## That store is fed by spark's own AppStatusListener, so nothing has to be registered on the listener bus from python.
+## Jobs are attributed to an analysis through their job group (SparkContext.setJobGroup).
+from datetime import datetime
+import json
+import time
+import urllib.request
+
+
+status_time_format = "%Y-%m-%dT%H:%M:%S.%f%Z"
+
+
+## Job group of the jobs of an analysis in a run, or in a batch of an incremental run
+## Without an analysis, the job group of the jobs reading the batch.
+def analysisJobGroup(spec, executionMode, batchName = None):
+    job_group_prefix = executionMode if batchName is None else f"{executionMode}-{batchName}"
+    if spec is None:
+        return job_group_prefix
+    return f"{job_group_prefix}-analysis-{spec.number}"
+
+## Milliseconds between two times of the status store (e.g. "2024-01-31T12:00:00.000GMT")
+def statusTimeDelta(startTime, endTime):
+    if not startTime or not endTime:
+        return None
+    return round((datetime.strptime(endTime, status_time_format) - datetime.strptime(startTime, status_time_format)).total_seconds() * 1000)
+
+
+class SparkMetrics:
+    def __init__(self, sc):
+        if not sc.uiWebUrl:
+            raise RuntimeError("Spark metrics need the spark UI (spark.ui.enabled)")
+        self.api_url = f"{sc.uiWebUrl}/api/v1/applications/{sc.applicationId}"
+
+    def request(self, path):
+        with urllib.request.urlopen(f"{self.api_url}/{path}") as response:
+            return json.load(response)
+
+    ## Jobs of a job group, once the status store has recorded the end of all of them
+    ## The listener bus is asynchronous: a job can still show as running for a moment after its action returned.
+    def jobGroupJobs(self, jobGroup, timeout = 30.0):
+        deadline = time.monotonic() + timeout
+        while True:
+            jobs = [job for job in self.request("jobs") if job.get("jobGroup") == jobGroup]
+            if all(job["status"] != "RUNNING" for job in jobs) or time.monotonic() > deadline:
+                return jobs
+            time.sleep(0.2)
+
+    ## Attempts of the stages run by the jobs of a job group (stages skipped because their output was reused are left out)
+    def jobGroupStages(self, jobGroup):
+        stage_ids = {stage_id for job in self.jobGroupJobs(jobGroup) for stage_id in job["stageIds"]}
+        return [stage for stage in self.request("stages") if stage["stageId"] in stage_ids and stage["status"] != "SKIPPED"]
+
+    ## Shuffle, spill and memory totals of a job group
+    ## Peak executor memory needs executor metrics polling (spark.executor.metrics.pollingInterval), otherwise it stays 0.
+    def jobGroupMetrics(self, jobGroup):
+        jobs = self.jobGroupJobs(jobGroup)
+        stages = self.jobGroupStages(jobGroup)
+        return {"jobs" : len(jobs), \
+                "failed_jobs" : len([job for job in jobs if job["status"] == "FAILED"]), \
+                "stages" : len(stages), \
+                "tasks" : sum(stage["numCompleteTasks"] for stage in stages), \
+                "executor_run_time_ms" : sum(stage["executorRunTime"] for stage in stages), \
+                "input_bytes" : sum(stage["inputBytes"] for stage in stages), \
+                "shuffle_read_bytes" : sum(stage["shuffleReadBytes"] for stage in stages), \
+                "shuffle_write_bytes" : sum(stage["shuffleWriteBytes"] for stage in stages), \
+                "memory_bytes_spilled" : sum(stage["memoryBytesSpilled"] for stage in stages), \
+                "disk_bytes_spilled" : sum(stage["diskBytesSpilled"] for stage in stages), \
+                "peak_execution_memory_bytes" : max([stage["peakExecutionMemory"] for stage in stages], default = 0), \
+                "peak_executor_jvm_heap_bytes" : max([stage.get("peakExecutorMetrics", {}).get("JVMHeapMemory", 0) for stage in stages], default = 0)}
+
+    ## Totals, stage timings and queries of a job group
+    def jobGroupReport(self, jobGroup):
+        return {"totals" : self.jobGroupMetrics(jobGroup), \
+                "stages" : self.jobGroupStageTimings(jobGroup), \
+                "queries" : self.jobGroupQueries(jobGroup)}
+
+    ## Timings, task skew, shuffle and spill of every stage attempt run by a job group
+    ## Task skew compares the slowest task of a stage with its median task (executor run time); a high ratio on a join
+    ## or aggregation stage points to hot keys.
+    def jobGroupStageTimings(self, jobGroup):
+        stage_timings = []
+        for stage in sorted(self.jobGroupStages(jobGroup), key = lambda stage: (stage["stageId"], stage["attemptId"])):
+            task_summary = self.request(f"stages/{stage['stageId']}/{stage['attemptId']}/taskSummary?quantiles=0.5,1.0")
+            median_task_time, max_task_time = task_summary["executorRunTime"]
+            stage_timings.append({"stage_id" : stage["stageId"], \
+                                  "attempt_id" : stage["attemptId"], \
+                                  "name" : stage["name"], \
+                                  "status" : stage["status"], \
+                                  "duration_ms" : statusTimeDelta(stage.get("submissionTime"), stage.get("completionTime")), \
+                                  "tasks" : stage["numCompleteTasks"], \
+                                  "executor_run_time_ms" : stage["executorRunTime"], \
+                                  "median_task_time_ms" : median_task_time, \
+                                  "max_task_time_ms" : max_task_time, \
+                                  "task_skew" : round(max_task_time / median_task_time, 2) if median_task_time else None, \
+                                  "input_bytes" : stage["inputBytes"], \
+                                  "shuffle_read_bytes" : stage["shuffleReadBytes"], \
+                                  "shuffle_write_bytes" : stage["shuffleWriteBytes"], \
+                                  "memory_bytes_spilled" : stage["memoryBytesSpilled"], \
+                                  "disk_bytes_spilled" : stage["diskBytesSpilled"]})
+        return stage_timings
+
+    ## SQL queries run by the jobs of a job group, with their physical plan
+    ## The plan is the "formatted" explain output; with adaptive query execution it is the final plan the query ran with.
+    def jobGroupQueries(self, jobGroup):
+        job_ids = {job["jobId"] for job in self.jobGroupJobs(jobGroup)}
+        queries = []
+        for execution in self.request("sql?details=false&planDescription=true&offset=0&length=100000"):
+            execution_job_ids = execution["successJobIds"] + execution["failedJobIds"] + execution["runningJobIds"]
+            if job_ids.intersection(execution_job_ids):
+                queries.append({"execution_id" : execution["id"], \
+                                "status" : execution["status"], \
+                                "duration_ms" : execution["duration"], \
+                                "jobs" : sorted(execution_job_ids), \
+                                "physical_plan" : execution["planDescription"]})
+        return queries
@@ -0,0 +1,66 @@
+# Writing of the analysis results and of the run reports to csv files
+import json
+import os
+
+from pyspark.sql.types import StructType, StructField, IntegerType, LongType, StringType, DoubleType
+
+
+## Function to write result data into a single csv file
+def writeDFtoCSV(inputDataFrame, fileName, filePath, writeMode):
+    inputDataFrame.coalesce(1) \
+                  .write.mode(writeMode) \
+                  .format("csv") \
+                  .option("header", True) \
+                  .save(f"{filePath}/{fileName}.csv")
+    return None
+
+## Write result records in a dataframe and then write it to a csv file
+def writeResults(spark, config, resultRows):
+    result_schema = StructType([StructField('Analysis_Description', StringType(), True), \
+                                StructField('Result', StringType(), True)])
+    results_df = spark.createDataFrame(resultRows, result_schema)
+    writeDFtoCSV(results_df, "Crashes_Analysis", config.result_filePath, "overwrite")
+    return None
+
+## Write the schema validation report (rows of each table that did not match its schema)
+def writeValidationReport(spark, config, rejectedRowCounts):
+    validation_schema = StructType([StructField('Table', StringType(), True), \
+                                    StructField('Rejected_Rows', IntegerType(), True), \
+                                    StructField('Malformed_Row_Policy', StringType(), True)])
+    validation_rows = [(table_name, rejected_rows, config.malformed_row_policy) for table_name, rejected_rows in rejectedRowCounts.items()]
+    validation_df = spark.createDataFrame(validation_rows, validation_schema)
+    writeDFtoCSV(validation_df, "Schema_Validation_Report", config.result_filePath, "overwrite")
+    return None
+
+## Write the join cardinality report (rows produced by each shared join)
+def writeJoinCardinalityReport(spark, config, cardinalityRows):
+    cardinality_schema = StructType([StructField('Join_View', StringType(), True), \
+                                     StructField('Join_Keys', StringType(), True), \
+                                     StructField('Joined_Rows', LongType(), True)])
+    cardinality_df = spark.createDataFrame(cardinalityRows, cardinality_schema)
+    writeDFtoCSV(cardinality_df, "Join_Cardinality_Report", config.result_filePath, "overwrite")
+    return None
+
+## Write the execution timing report (wall-clock seconds of every analysis and of the whole run, per execution mode)
+def writeTimingReport(spark, config, timingRows):
+    timing_schema = StructType([StructField('Execution_Mode', StringType(), True), \
+                                StructField('Analysis', StringType(), True), \
+                                StructField('Wall_Clock_Seconds', DoubleType(), True)])
+    timing_df = spark.createDataFrame(timingRows, timing_schema)
+    writeDFtoCSV(timing_df, "Execution_Timing_Report", config.result_filePath, "overwrite")
+    return None
+
+## Write the incremental batch report (new crashes of every batch applied by the run)
+def writeBatchReport(spark, config, batchRows):
+    batch_schema = StructType([StructField('Batch', StringType(), True), \
+                               StructField('New_Crashes', LongType(), True)])
+    batch_df = spark.createDataFrame(batchRows, batch_schema)
+    writeDFtoCSV(batch_df, "Incremental_Batch_Report", config.result_filePath, "overwrite")
+    return None
+
+## Write the metrics of every analysis (see crashes.metrics) as a JSON file next to the csv reports
+def writeMetricsReport(config, analysisMetrics):
+    os.makedirs(config.result_filePath, exist_ok = True)
+    with open(os.path.join(config.result_filePath, config.metrics_fileName), "w") as outputFile:
+        json.dump({"analyses" : analysisMetrics}, outputFile, indent = 2)
+    return None
@@ -0,0 +1,190 @@
+# Registry of the analyses and of the joined views they share
+## Each analysis declares the tables and columns it reads and the shared views it uses, so that a run only loads
+## the inputs of the analyses it selects. This module does not import pyspark: listing and selecting analyses is instant.
+from collections import namedtuple
+import importlib
+
+## number: position of the analysis in the case study, groupings: shared groupings it reads, aggregates: partial aggregates
+## returned by its function, function / result: "<module>:<function>" computing its partial aggregates / deriving its result from them
+AnalysisSpec = namedtuple("AnalysisSpec", ["number", "name", "description", "tables", "views", "groupings", "aggregates", "function", "result"])
+## tables: columns read from each table, views: other shared views the view is built from
+JoinViewSpec = namedtuple("JoinViewSpec", ["tables", "views"])
+## source: table or shared view grouped, columns: columns read from a source table, keys: grouping columns (none for a grand total),
+## where: SQL condition on the rows grouped (None for all rows), measures: {name : (function, column)} with function sum or count
+## (column "*" for rows), top_n: number of most frequent keys the analyses use (None if they use all keys)
+GroupingSpec = namedtuple("GroupingSpec", ["source", "columns", "keys", "where", "measures", "top_n"])
+## keys: grouping columns, measures: columns summed when aggregates are merged (none for sets of distinct CRASH_IDs)
+AggregateSpec = namedtuple("AggregateSpec", ["keys", "measures"])
+## Column of a set of CRASH_IDs given already counted: a single row holding its number of CRASH_IDs
+crash_count_column = "CRASH_CNT"
+
+join_view_specs = {"units_charges" : JoinViewSpec(tables = {"Units" : ("CRASH_ID", "UNIT_NBR", "VEH_BODY_STYL_ID", "VEH_COLOR_ID", "VEH_LIC_STATE_ID", "VEH_MAKE_ID"), \
+                                                            "Charges" : ("CRASH_ID", "UNIT_NBR", "PRSN_NBR", "CHARGE")}, \
+                                                  views = ()), \
+                   "person_units" : JoinViewSpec(tables = {"Primary_Person" : ("CRASH_ID", "UNIT_NBR", "PRSN_ETHNICITY_ID", "DRVR_ZIP"), \
+                                                           "Units" : ("CRASH_ID", "UNIT_NBR", "VEH_BODY_STYL_ID", "CONTRIB_FACTR_1_ID", "CONTRIB_FACTR_2_ID")}, \
+                                                 views = ()), \
+                   "units_charges_person" : JoinViewSpec(tables = {"Primary_Person" : ("CRASH_ID", "UNIT_NBR", "PRSN_NBR", "DRVR_LIC_TYPE_ID")}, \
+                                                         views = ("units_charges",))}
+
+## Groupings of the same source are computed together, in a single pass over it (see crashes.groupings)
+## Only groupings with few keys are shared: a set of CRASH_IDs (e.g. of analysis 7) stays a filtered distinct of its analysis.
+grouping_specs = {"injuries_by_veh_make" : GroupingSpec(source = "Units", columns = ("VEH_MAKE_ID", "TOT_INJRY_CNT"), \
+                                                        keys = ("VEH_MAKE_ID",), \
+                                                        where = "VEH_MAKE_ID != 'NA'", \
+                                                        measures = {"TOT_INJ_VEH_ID" : ("sum", "TOT_INJRY_CNT")}, \
+                                                        top_n = None), \
+                  "units_by_veh_color" : GroupingSpec(source = "Units", columns = ("VEH_COLOR_ID",), \
+                                                      keys = ("VEH_COLOR_ID",), \
+                                                      where = None, \
+                                                      measures = {"VEH_COL_CNT" : ("count", "*")}, \
+                                                      top_n = 10), \
+                  "offences_by_veh_lic_state" : GroupingSpec(source = "units_charges", columns = (), \
+                                                             keys = ("VEH_LIC_STATE_ID",), \
+                                                             where = None, \
+                                                             measures = {"VEH_LIC_STATE_CNT" : ("count", "*")}, \
+                                                             top_n = 25)}
+
+analysis_specs = (
+    AnalysisSpec(number = 1, name = "male_death_crashes", \
+                 description = "Number of crashes where number of persons killed are male", \
+                 tables = {"Primary_Person" : ("CRASH_ID", "DEATH_CNT", "PRSN_GNDR_ID")}, \
+                 views = (), \
+                 groupings = (), \
+                 aggregates = {"male_death_crash_ids" : AggregateSpec(keys = ("CRASH_ID",), measures = ())}, \
+                 function = "crashes.analyses:maleDeathCrashes", \
+                 result = "crashes.analyses:maleDeathCrashCount"),
+    AnalysisSpec(number = 2, name = "two_wheelers_booked", \
+                 description = "Number of two wheelers booked for crashes", \
+                 tables = {}, \
+                 views = ("units_charges",), \
+                 groupings = (), \
+                 aggregates = {"two_wheeler_booked_crash_ids" : AggregateSpec(keys = ("CRASH_ID",), measures = ())}, \
+                 function = "crashes.analyses:twoWheelersBooked", \
+                 result = "crashes.analyses:twoWheelersBookedCount"),
+    AnalysisSpec(number = 3, name = "female_accidents_state", \
+                 description = "State having highest accidents where females are involved", \
+                 tables = {"Primary_Person" : ("CRASH_ID", "PRSN_GNDR_ID", "DRVR_LIC_STATE_ID")}, \
+                 views = (), \
+                 groupings = (), \
+                 aggregates = {"female_accidents_by_state" : AggregateSpec(keys = ("DRVR_LIC_STATE_ID",), measures = ("HIGH_CRASH_FEMALE",))}, \
+                 function = "crashes.analyses:femaleAccidentsByState", \
+                 result = "crashes.analyses:highestFemaleAccidentState"),
+    AnalysisSpec(number = 4, name = "injury_veh_makes_5_to_15", \
+                 description = "Vehicle manufacturer's that contributes to largest no of injuries including death : Top 5th to top 15th", \
+                 tables = {}, \
+                 views = (), \
+                 groupings = ("injuries_by_veh_make",), \
+                 aggregates = {"injuries_by_veh_make" : AggregateSpec(keys = ("VEH_MAKE_ID",), measures = ("TOT_INJ_VEH_ID",))}, \
+                 function = "crashes.analyses:injuriesByVehicleMake", \
+                 result = "crashes.analyses:topInjuryVehicleMakes5to15"),
+    AnalysisSpec(number = 5, name = "body_style_top_ethnicity", \
+                 description = "Top ethnic user group of each body style", \
+                 tables = {}, \
+                 views = ("person_units",), \
+                 groupings = (), \
+                 aggregates = {"ethnic_groups_by_body_style" : AggregateSpec(keys = ("VEH_BODY_STYL_ID", "PRSN_ETHNICITY_ID"), measures = ("ETHNICITY_CRASH_CNT",))}, \
+                 function = "crashes.analyses:ethnicGroupsByBodyStyle", \
+                 result = "crashes.analyses:topEthnicGroupByBodyStyle"),
+    AnalysisSpec(number = 6, name = "alcohol_crash_zip_codes", \
+                 description = "Top 5 zip codes having highest no of car crashes with alcohol as the contributing factor to crash", \
+                 tables = {}, \
+                 views = ("person_units",), \
+                 groupings = (), \
+                 aggregates = {"alcohol_car_crashes_by_zip" : AggregateSpec(keys = ("DRVR_ZIP",), measures = ("CAR_CRASH_CNT",))}, \
+                 function = "crashes.analyses:alcoholCarCrashesByZipCode", \
+                 result = "crashes.analyses:topAlcoholCrashZipCodes"),
+    AnalysisSpec(number = 7, name = "insured_damage_crashes", \
+                 description = "Count of distinct crash Id's where no damage property was observed, damage level was above 4 and car avails Insurance", \
+                 tables = {"Units" : ("CRASH_ID", "VEH_DMAG_SCL_1_ID", "VEH_DMAG_SCL_2_ID", "FIN_RESP_TYPE_ID"), \
+                           "Damages" : ("CRASH_ID", "DAMAGED_PROPERTY")}, \
+                 views = (), \
+                 groupings = (), \
+                 aggregates = {"insured_damage_crash_ids" : AggregateSpec(keys = ("CRASH_ID",), measures = ())}, \
+                 function = "crashes.analyses:insuredHighDamageCrashes", \
+                 result = "crashes.analyses:insuredHighDamageCrashCount"),
+    AnalysisSpec(number = 8, name = "speeding_veh_makes", \
+                 description = "Top 5 vehicle manufacturer's where drivers are charged with speeding related offences, has licensed Drivers, used top 10 vehicle colours and has car licensed with the Top 25 states with highest number of offences", \
+                 tables = {}, \
+                 views = ("units_charges", "units_charges_person"), \
+                 groupings = ("units_by_veh_color", "offences_by_veh_lic_state"), \
+                 aggregates = {"units_by_veh_color" : AggregateSpec(keys = ("VEH_COLOR_ID",), measures = ("VEH_COL_CNT",)), \
+                               "offences_by_veh_lic_state" : AggregateSpec(keys = ("VEH_LIC_STATE_ID",), measures = ("VEH_LIC_STATE_CNT",)), \
+                               "speeding_offences_by_veh" : AggregateSpec(keys = ("VEH_MAKE_ID", "VEH_COLOR_ID", "VEH_LIC_STATE_ID"), measures = ("OFFENCE_CNT",))}, \
+                 function = "crashes.analyses:speedingOffencesByVehicle", \
+                 result = "crashes.analyses:topSpeedingVehicleMakes"),
+)
+
+
+## Function to select analyses from a comma separated list of numbers and/or names (all analyses if empty)
+def selectAnalyses(selection = None):
+    if not selection:
+        return list(analysis_specs)
+    by_key = {}
+    for spec in analysis_specs:
+        by_key[str(spec.number)] = spec
+        by_key[spec.name] = spec
+    selected_numbers = set()
+    for key in selection.split(","):
+        key = key.strip()
+        if key not in by_key:
+            raise ValueError(f"Unknown analysis: {key}")
+        selected_numbers.add(by_key[key].number)
+    return [spec for spec in analysis_specs if spec.number in selected_numbers]
+
+## Function to list the shared views an analysis uses, including the views its groupings and other views are built from
+def analysisViews(spec):
+    views = []
+    pending = list(spec.views) + [grouping_specs[grouping_name].source for grouping_name in spec.groupings if grouping_specs[grouping_name].source in join_view_specs]
+    while pending:
+        view_name = pending.pop(0)
+        if view_name not in views:
+            views.append(view_name)
+            pending.extend(join_view_specs[view_name].views)
+    return views
+
+## Function to collect the columns of each table read by the given analyses and the views they use
+def requiredColumns(specs):
+    columns = {}
+    for spec in specs:
+        table_columns = [spec.tables] + [join_view_specs[view_name].tables for view_name in analysisViews(spec)] \
+                        + [{grouping_specs[grouping_name].source : grouping_specs[grouping_name].columns} for grouping_name in spec.groupings \
+                           if grouping_specs[grouping_name].source not in join_view_specs]
+        for tables in table_columns:
+            for table_name, table_column_names in tables.items():
+                columns.setdefault(table_name, set()).update(table_column_names)
+    return columns
+
+## Function to map each shared view to the numbers of the given analyses that use it
+def viewConsumers(specs):
+    consumers = {}
+    for spec in specs:
+        for view_name in analysisViews(spec):
+            consumers.setdefault(view_name, set()).add(spec.number)
+    return consumers
+
+## Function to map each source of shared groupings to the groupings the given analyses use, in registry order
+def sourceGroupings(specs):
+    used_groupings = {grouping_name for spec in specs for grouping_name in spec.groupings}
+    groupings = {}
+    for grouping_name, grouping_spec in grouping_specs.items():
+        if grouping_name in used_groupings:
+            groupings.setdefault(grouping_spec.source, []).append(grouping_name)
+    return groupings
+
+## Function to map each source of shared groupings to the numbers of the given analyses that use its groupings
+def groupingConsumers(specs):
+    consumers = {}
+    for spec in specs:
+        for grouping_name in spec.groupings:
+            consumers.setdefault(grouping_specs[grouping_name].source, set()).add(spec.number)
+    return consumers
+
+## Function to import a function given as "<module>:<function>"
+def loadFunction(functionPath):
+    module_name, function_name = functionPath.split(":")
+    return getattr(importlib.import_module(module_name), function_name)
+
+## Function to import the functions computing the partial aggregates and the result of an analysis
+def loadAnalysisFunctions(spec):
+    return loadFunction(spec.function), loadFunction(spec.result)
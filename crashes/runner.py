@@ -0,0 +1,163 @@
+# Run of a selection of analyses: spark session, loading of the inputs they need, analyses and result files
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import time
+
+import pyspark
+from pyspark.sql import SparkSession
+
+from crashes.context import AnalysisContext
+from crashes.groupings import SharedGroupings
+from crashes.incremental import runIncremental
+from crashes.ingest import readCrashTable
+from crashes.joins import JoinViews
+from crashes.metrics import SparkMetrics, analysisJobGroup
+from crashes.output import writeResults, writeValidationReport, writeJoinCardinalityReport, writeTimingReport, writeBatchReport, writeMetricsReport
+from crashes.registry import requiredColumns, viewConsumers, sourceGroupings, groupingConsumers, loadAnalysisFunctions
+from crashes.schemas import table_schemas
+
+logger = logging.getLogger(__name__)
+
+## Creating spark context and spark session
+## Concurrent runs use the FAIR scheduler so that the jobs of the analyses share the executors instead of queueing.
+## Adaptive execution re-plans joins from the actual shuffle sizes: small sides are broadcast and skewed partitions split.
+def createSparkSession(config):
+    sp_conf = pyspark.SparkConf().setAppName(config.app_name).setMaster(config.master)
+    if config.execution_mode == "concurrent" or config.compare_execution_modes:
+        sp_conf.set("spark.scheduler.mode", "FAIR")
+        if config.fair_scheduler_allocation_file:
+            sp_conf.set("spark.scheduler.allocation.file", config.fair_scheduler_allocation_file)
+    broadcast_threshold = str(config.broadcast_threshold_bytes) if config.broadcast_threshold_bytes > 0 else "-1"
+    sp_conf.set("spark.sql.autoBroadcastJoinThreshold", broadcast_threshold)
+    sp_conf.set("spark.sql.adaptive.autoBroadcastJoinThreshold", broadcast_threshold)
+    sp_conf.set("spark.sql.adaptive.enabled", "true")
+    sp_conf.set("spark.sql.adaptive.advisoryPartitionSizeInBytes", config.advisory_partition_size)
+    sp_conf.set("spark.sql.adaptive.skewJoin.enabled", str(config.adaptive_skew_join).lower())
+    sp_conf.set("spark.sql.adaptive.skewJoin.skewedPartitionFactor", str(config.skew_partition_factor))
+    sp_conf.set("spark.sql.adaptive.skewJoin.skewedPartitionThresholdInBytes", config.skew_partition_threshold)
+    if config.executor_metrics_polling_interval:
+        sp_conf.set("spark.executor.metrics.pollingInterval", config.executor_metrics_polling_interval)
+    sc = pyspark.SparkContext(conf = sp_conf)
+    return SparkSession(sc)
+
+## Read the tables used by the given analyses, keeping only the columns they declare
+def loadTables(spark, config, specs, rejectedRowCounts):
+    columns = requiredColumns(specs)
+    return {table_name : readCrashTable(spark, config, table_name, columns[table_name], rejectedRowCounts) \
+            for table_name in table_schemas if table_name in columns}
+
+## Run one analysis (in the given scheduler pool, if any) and unpersist the views and groupings it was the last to use
+## Its jobs are tagged with the given job group, which the metrics of the analysis are collected from.
+## Returns its result and its wall-clock time in seconds.
+def runAnalysis(ctx, spec, schedulerPool, jobGroup):
+    sc = ctx.spark.sparkContext
+    sc.setLocalProperty("spark.scheduler.pool", schedulerPool)
+    sc.setJobGroup(jobGroup, f"Analysis {spec.number}: {spec.name}")
+    start_time = time.perf_counter()
+    aggregate, derive_result = loadAnalysisFunctions(spec)
+    result = derive_result(aggregate(ctx))
+    ctx.groupings.release(spec.number)
+    ctx.join_views.release(spec.number)
+    return result, time.perf_counter() - start_time
+
+## Run the given analyses sequentially or concurrently, with their own shared join views and groupings
+## Results are returned in the order of the given analyses whatever order they finish in.
+def executeAnalyses(spark, config, tables, specs, executionMode):
+    join_views = JoinViews(config, tables, viewConsumers(specs))
+    groupings = SharedGroupings(config, tables, join_views, sourceGroupings(specs), groupingConsumers(specs))
+    ctx = AnalysisContext(spark, config, tables, join_views, groupings)
+    start_time = time.perf_counter()
+    if executionMode == "concurrent":
+        with ThreadPoolExecutor(max_workers = config.max_concurrent_analyses, thread_name_prefix = "analysis") as executor:
+            futures = [executor.submit(runAnalysis, ctx, spec, f"analysis_{spec.number}", analysisJobGroup(spec, executionMode)) for spec in specs]
+            outcomes = [future.result() for future in futures]
+    else:
+        outcomes = [runAnalysis(ctx, spec, None, analysisJobGroup(spec, executionMode)) for spec in specs]
+    run_time = time.perf_counter() - start_time
+    spark.sparkContext.setJobGroup(None, None)
+    result_rows = [(spec.description, result) for spec, (result, _) in zip(specs, outcomes)]
+    timing_rows = [(executionMode, str(spec.number), analysis_time) for spec, (_, analysis_time) in zip(specs, outcomes)]
+    timing_rows.append((executionMode, "all", run_time))
+    return result_rows, timing_rows, join_views.cardinality_rows
+
+## Metrics of the analyses of a run, collected from their job groups once all of them have finished
+## The jobs building a shared view count towards the first analysis that used it.
+def collectAnalysisMetrics(spark, specs, executionMode, timingRows):
+    spark_metrics = SparkMetrics(spark.sparkContext)
+    analysis_times = {analysis : analysis_time for mode, analysis, analysis_time in timingRows if mode == executionMode}
+    analysis_metrics = []
+    for spec in specs:
+        job_group = analysisJobGroup(spec, executionMode)
+        metrics = {"execution_mode" : executionMode, \
+                   "number" : spec.number, \
+                   "name" : spec.name, \
+                   "job_group" : job_group, \
+                   "wall_clock_seconds" : analysis_times[str(spec.number)]}
+        metrics.update(spark_metrics.jobGroupReport(job_group))
+        analysis_metrics.append(metrics)
+    return analysis_metrics
+
+## Metrics of the job groups of an incremental run: reading of each batch, aggregation of each analysis in each batch and
+## derivation of the results from the merged aggregates
+def collectIncrementalMetrics(spark, analysisRuns):
+    spark_metrics = SparkMetrics(spark.sparkContext)
+    analysis_metrics = []
+    for batch_name, spec, job_group, analysis_time in analysisRuns:
+        metrics = {"execution_mode" : "incremental", \
+                   "batch" : batch_name, \
+                   "number" : spec.number if spec is not None else None, \
+                   "name" : spec.name if spec is not None else "batch_reading", \
+                   "job_group" : job_group, \
+                   "wall_clock_seconds" : analysis_time}
+        metrics.update(spark_metrics.jobGroupReport(job_group))
+        analysis_metrics.append(metrics)
+    return analysis_metrics
+
+## Collect and write the metrics of a run (collectMetrics returns them)
+## The results are already written: metrics that cannot be collected (spark UI disabled, status API unavailable) are
+## reported as a warning instead of failing the run.
+def writeRunMetrics(config, collectMetrics):
+    try:
+        writeMetricsReport(config, collectMetrics())
+    except (RuntimeError, OSError, ValueError, KeyError) as error:
+        logger.warning(f"Analysis metrics not written to {config.metrics_fileName}: {error}")
+    return None
+
+## Run the given analyses and write their results and the run reports
+## Returns the (description, result) row of every analysis.
+def runAnalyses(config, specs):
+    spark = createSparkSession(config)
+    try:
+        rejected_row_counts = {}
+        if config.incremental:
+            result_rows, batch_rows, analysis_runs = runIncremental(spark, config, specs, rejected_row_counts)
+            writeResults(spark, config, result_rows)
+            writeValidationReport(spark, config, rejected_row_counts)
+            writeBatchReport(spark, config, batch_rows)
+            if config.instrumentation:
+                writeRunMetrics(config, lambda: collectIncrementalMetrics(spark, analysis_runs))
+            return result_rows
+        tables = loadTables(spark, config, specs, rejected_row_counts)
+        timing_rows = []
+        execution_modes = []
+        if config.compare_execution_modes:
+            # The sequential run goes first: it also warms up the inputs, which only favours the concurrent run by the cost of the first reads
+            _, sequential_timing_rows, _ = executeAnalyses(spark, config, tables, specs, "sequential")
+            timing_rows.extend(sequential_timing_rows)
+            execution_modes.append("sequential")
+            execution_mode = "concurrent"
+        else:
+            execution_mode = config.execution_mode
+        result_rows, execution_timing_rows, cardinality_rows = executeAnalyses(spark, config, tables, specs, execution_mode)
+        timing_rows.extend(execution_timing_rows)
+        execution_modes.append(execution_mode)
+        writeResults(spark, config, result_rows)
+        writeValidationReport(spark, config, rejected_row_counts)
+        writeJoinCardinalityReport(spark, config, cardinality_rows)
+        writeTimingReport(spark, config, timing_rows)
+        if config.instrumentation:
+            writeRunMetrics(config, lambda: [metrics for mode in execution_modes for metrics in collectAnalysisMetrics(spark, specs, mode, timing_rows)])
+    finally:
+        # Stop spark session
+        spark.stop()
+    return result_rows
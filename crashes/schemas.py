@@ -0,0 +1,104 @@
+# Schemas of the six input tables
+from pyspark.sql.types import StructType, StructField, IntegerType, StringType, DoubleType, TimestampType
+
+## PrimaryPerson
+primary_person_schema = StructType([StructField('CRASH_ID', IntegerType(), True), \
+                                    StructField('UNIT_NBR', IntegerType(), True), \
+                                    StructField('PRSN_NBR', IntegerType(), True), \
+                                    StructField('PRSN_TYPE_ID', StringType(), True), \
+                                    StructField('PRSN_OCCPNT_POS_ID', StringType(), True), \
+                                    StructField('PRSN_INJRY_SEV_ID', StringType(), True), \
+                                    StructField('PRSN_AGE', IntegerType(), True), \
+                                    StructField('PRSN_ETHNICITY_ID', StringType(), True), \
+                                    StructField('PRSN_GNDR_ID', StringType(), True), \
+                                    StructField('PRSN_EJCT_ID', StringType(), True), \
+                                    StructField('PRSN_REST_ID', StringType(), True), \
+                                    StructField('PRSN_AIRBAG_ID', StringType(), True), \
+                                    StructField('PRSN_HELMET_ID', StringType(), True), \
+                                    StructField('PRSN_SOL_FL', StringType(), True), \
+                                    StructField('PRSN_ALC_SPEC_TYPE_ID', StringType(), True), \
+                                    StructField('PRSN_ALC_RSLT_ID', StringType(), True), \
+                                    StructField('PRSN_BAC_TEST_RSLT', DoubleType(), True), \
+                                    StructField('PRSN_DRG_SPEC_TYPE_ID', StringType(), True), \
+                                    StructField('PRSN_DRG_RSLT_ID', StringType(), True), \
+                                    StructField('DRVR_DRG_CAT_1_ID', StringType(), True), \
+                                    StructField('PRSN_DEATH_TIME', TimestampType(), True), \
+                                    StructField('INCAP_INJRY_CNT', IntegerType(), True), \
+                                    StructField('NONINCAP_INJRY_CNT', IntegerType(), True), \
+                                    StructField('POSS_INJRY_CNT', IntegerType(), True), \
+                                    StructField('NON_INJRY_CNT', IntegerType(), True), \
+                                    StructField('UNKN_INJRY_CNT', IntegerType(), True), \
+                                    StructField('TOT_INJRY_CNT', IntegerType(), True), \
+                                    StructField('DEATH_CNT', IntegerType(), True), \
+                                    StructField('DRVR_LIC_TYPE_ID', StringType(), True), \
+                                    StructField('DRVR_LIC_STATE_ID', StringType(), True), \
+                                    StructField('DRVR_LIC_CLS_ID', StringType(), True), \
+                                    StructField('DRVR_ZIP', StringType(), True)])
+
+## Restrict
+restrict_schema = StructType([StructField('CRASH_ID', IntegerType(), True), \
+                              StructField('UNIT_NBR', IntegerType(), True), \
+                              StructField('DRVR_LIC_RESTRIC_ID', StringType(), True)])
+
+## Unit
+units_schema = StructType([StructField('CRASH_ID', IntegerType(), True), \
+                           StructField('UNIT_NBR', IntegerType(), True), \
+                           StructField('UNIT_DESC_ID', StringType(), True), \
+                           StructField('VEH_PARKED_FL', StringType(), True), \
+                           StructField('VEH_HNR_FL', StringType(), True), \
+                           StructField('VEH_LIC_STATE_ID', StringType(), True), \
+                           StructField('VIN', StringType(), True), \
+                           StructField('VEH_MOD_YEAR', IntegerType(), True), \
+                           StructField('VEH_COLOR_ID', StringType(), True), \
+                           StructField('VEH_MAKE_ID', StringType(), True), \
+                           StructField('VEH_MOD_ID', StringType(), True), \
+                           StructField('VEH_BODY_STYL_ID', StringType(), True), \
+                           StructField('EMER_RESPNDR_FL', StringType(), True), \
+                           StructField('OWNR_ZIP', StringType(), True), \
+                           StructField('FIN_RESP_PROOF_ID', StringType(), True), \
+                           StructField('FIN_RESP_TYPE_ID', StringType(), True), \
+                           StructField('VEH_DMAG_AREA_1_ID', StringType(), True), \
+                           StructField('VEH_DMAG_SCL_1_ID', StringType(), True), \
+                           StructField('FORCE_DIR_1_ID', StringType(), True), \
+                           StructField('VEH_DMAG_AREA_2_ID', StringType(), True), \
+                           StructField('VEH_DMAG_SCL_2_ID', StringType(), True), \
+                           StructField('FORCE_DIR_2_ID', StringType(), True), \
+                           StructField('VEH_INVENTORIED_FL', StringType(), True), \
+                           StructField('VEH_TRANSP_NAME', StringType(), True), \
+                           StructField('VEH_TRANSP_DEST', StringType(), True), \
+                           StructField('CONTRIB_FACTR_1_ID', StringType(), True), \
+                           StructField('CONTRIB_FACTR_2_ID', StringType(), True), \
+                           StructField('CONTRIB_FACTR_P1_ID', StringType(), True), \
+                           StructField('VEH_TRVL_DIR_ID', StringType(), True), \
+                           StructField('FIRST_HARM_EVT_INV_ID', StringType(), True), \
+                           StructField('INCAP_INJRY_CNT', IntegerType(), True), \
+                           StructField('NONINCAP_INJRY_CNT', IntegerType(), True), \
+                           StructField('POSS_INJRY_CNT', IntegerType(), True), \
+                           StructField('NON_INJRY_CNT', IntegerType(), True), \
+                           StructField('UNKN_INJRY_CNT', IntegerType(), True), \
+                           StructField('TOT_INJRY_CNT', IntegerType(), True), \
+                           StructField('DEATH_CNT', IntegerType(), True)])
+
+## Charges
+charges_schema = StructType([StructField('CRASH_ID', IntegerType(), True), \
+                             StructField('UNIT_NBR', IntegerType(), True), \
+                             StructField('PRSN_NBR', IntegerType(), True), \
+                             StructField('CHARGE', StringType(), True), \
+                             StructField('CITATION_NBR', StringType(), True)])
+
+## Damages
+damages_schema = StructType([StructField('CRASH_ID', IntegerType(), True), \
+                             StructField('DAMAGED_PROPERTY', StringType(), True)])
+
+## Endorsements
+endorse_schema = StructType([StructField('CRASH_ID', IntegerType(), True), \
+                             StructField('UNIT_NBR', IntegerType(), True), \
+                             StructField('DRVR_LIC_ENDORS_ID', StringType(), True)])
+
+## Schema of each table, by table name (the csv file of a table is <table name>_use.csv)
+table_schemas = {"Primary_Person" : primary_person_schema, \
+                 "Restrict" : restrict_schema, \
+                 "Units" : units_schema, \
+                 "Charges" : charges_schema, \
+                 "Damages" : damages_schema, \
+                 "Endorse" : endorse_schema}
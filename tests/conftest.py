@@ -0,0 +1,13 @@
+# Shared fixtures of the tests
+import pytest
+
+
+## Local spark session shared by the spark tests
+@pytest.fixture(scope = "session")
+def spark():
+    from crashes.config import CrashesConfig
+    from crashes.runner import createSparkSession
+    spark = createSparkSession(CrashesConfig(master = "local[1]", instrumentation = False))
+    spark.sparkContext.setLogLevel("ERROR")
+    yield spark
+    spark.stop()
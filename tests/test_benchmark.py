@@ -0,0 +1,14 @@
+# Tests of the comparison of a benchmark with its baseline
+from benchmarks.run_benchmark import regressions
+
+
+def benchmarkFile(wallTimes):
+    return {"analyses" : [{"number" : number, "name" : f"analysis_{number}", "wall_time_s" : wall_time} for number, wall_time in wallTimes.items()]}
+
+def test_regressionsAboveTolerance():
+    benchmark = benchmarkFile({1 : 1.0, 2 : 2.3, 3 : 3.0})
+    baseline = benchmarkFile({1 : 1.0, 2 : 2.0, 3 : 2.8})
+    assert [slower_analysis[0] for slower_analysis in regressions(benchmark, baseline, 0.1)] == [2]
+
+def test_regressionsIgnoreAnalysesMissingFromBaseline():
+    assert regressions(benchmarkFile({1 : 5.0, 9 : 5.0}), benchmarkFile({1 : 5.0}), 0.1) == []
@@ -0,0 +1,78 @@
+# Tests of the shared groupings: their declaration in the registry, the combined aggregation and the roll up of each grouping
+import pytest
+
+from crashes.config import CrashesConfig
+from crashes.groupings import combinedGroupingQuery, rolledUpRows, samplingFraction, scaledMeasure, scaledValue, sampledGrouping
+from crashes.registry import GroupingSpec, grouping_specs, join_view_specs, selectAnalyses, requiredColumns, sourceGroupings, groupingConsumers
+
+## Grouping of the units sharing the key of injuries_by_veh_make
+units_by_veh_make = GroupingSpec(source = "Units", columns = ("VEH_MAKE_ID",), keys = ("VEH_MAKE_ID",), where = None, \
+                                 measures = {"VEH_MAKE_CNT" : ("count", "*")}, top_n = 5)
+
+
+def test_sourceGroupingsInRegistryOrder():
+    specs = selectAnalyses("8,4")
+    assert sourceGroupings(specs) == {"Units" : ["injuries_by_veh_make", "units_by_veh_color"], "units_charges" : ["offences_by_veh_lic_state"]}
+    assert groupingConsumers(specs) == {"Units" : {4, 8}, "units_charges" : {8}}
+
+def test_requiredColumnsOfGroupingOnTable():
+    columns = requiredColumns(selectAnalyses("4"))
+    assert columns == {"Units" : set(grouping_specs["injuries_by_veh_make"].columns)}
+
+## Analysis 8 reads its tables through the shared views it uses (units_charges_person is built from units_charges) and its groupings
+def test_requiredColumnsOfViewsAndGroupings():
+    columns = requiredColumns(selectAnalyses("8"))
+    expected_columns = {}
+    for view_name in ("units_charges", "units_charges_person"):
+        for table_name, table_column_names in join_view_specs[view_name].tables.items():
+            expected_columns.setdefault(table_name, set()).update(table_column_names)
+    expected_columns["Units"].update(grouping_specs["units_by_veh_color"].columns)
+    assert columns == expected_columns
+
+def test_combinedGroupingQuery():
+    query = combinedGroupingQuery(["injuries_by_veh_make", "units_by_veh_color"])
+    assert query == "SELECT _f0, _f1, `VEH_MAKE_ID`, `VEH_COLOR_ID`, " \
+                    "sum(`TOT_INJRY_CNT`) AS `_m0_TOT_INJ_VEH_ID`, count(*) AS `_m1_VEH_COL_CNT` " \
+                    "FROM {source} GROUP BY _f0, _f1, `VEH_MAKE_ID`, `VEH_COLOR_ID`"
+
+## Keys shared by several groupings are grouped on once
+def test_combinedGroupingQuerySharedKeys(monkeypatch):
+    monkeypatch.setitem(grouping_specs, "units_by_veh_make", units_by_veh_make)
+    query = combinedGroupingQuery(["injuries_by_veh_make", "units_by_veh_make"])
+    assert query == "SELECT _f0, _f1, `VEH_MAKE_ID`, " \
+                    "sum(`TOT_INJRY_CNT`) AS `_m0_TOT_INJ_VEH_ID`, count(*) AS `_m1_VEH_MAKE_CNT` " \
+                    "FROM {source} GROUP BY _f0, _f1, `VEH_MAKE_ID`"
+
+## Each grouping keeps the combined rows of its flag, summed by its own keys; null partial sums stay null
+def test_rolledUpRows():
+    combined_rows = [{"_f0" : True, "_f1" : True, "VEH_MAKE_ID" : "FORD", "VEH_COLOR_ID" : "RED", "_m0_TOT_INJ_VEH_ID" : 2, "_m1_VEH_COL_CNT" : 3}, \
+                     {"_f0" : True, "_f1" : True, "VEH_MAKE_ID" : "FORD", "VEH_COLOR_ID" : "BLUE", "_m0_TOT_INJ_VEH_ID" : None, "_m1_VEH_COL_CNT" : 1}, \
+                     {"_f0" : False, "_f1" : True, "VEH_MAKE_ID" : "NA", "VEH_COLOR_ID" : "RED", "_m0_TOT_INJ_VEH_ID" : 5, "_m1_VEH_COL_CNT" : 4}, \
+                     {"_f0" : True, "_f1" : True, "VEH_MAKE_ID" : "KIA", "VEH_COLOR_ID" : "RED", "_m0_TOT_INJ_VEH_ID" : None, "_m1_VEH_COL_CNT" : 2}]
+    assert sorted(rolledUpRows(combined_rows, 0, grouping_specs["injuries_by_veh_make"], 1.0)) == [("FORD", 2), ("KIA", None)]
+    assert sorted(rolledUpRows(combined_rows, 1, grouping_specs["units_by_veh_color"], 1.0)) == [("BLUE", 1), ("RED", 9)]
+    assert sorted(rolledUpRows(combined_rows, 1, grouping_specs["units_by_veh_color"], 0.25)) == [("BLUE", 4), ("RED", 36)]
+
+def test_scaledMeasure():
+    assert scaledMeasure("count(*)", 1.0) == "count(*)"
+    assert scaledMeasure("count(*)", 0.25) == "CAST(round(count(*) / 0.25) AS BIGINT)"
+
+## Values are scaled and rounded half up, like round in spark SQL
+def test_scaledValue():
+    assert scaledValue(7, 1.0) == 7
+    assert scaledValue(7, 0.25) == 28
+    assert scaledValue(1, 0.4) == 3
+    assert scaledValue(3, 0.4) == 8
+    assert scaledValue(None, 0.25) is None
+
+## The standard error of the share of the rows of a key holding all rows stays at the error bound
+def test_samplingFraction():
+    assert samplingFraction(0.001, 0) == 1
+    assert samplingFraction(0.001, 4000000) == pytest.approx(0.2)
+    fraction = samplingFraction(0.01, 250000)
+    assert ((1 - fraction) / (fraction * 250000)) ** 0.5 == pytest.approx(0.01)
+
+def test_sampledGrouping():
+    assert not sampledGrouping(grouping_specs["units_by_veh_color"], CrashesConfig())
+    assert sampledGrouping(grouping_specs["units_by_veh_color"], CrashesConfig(approximate = True))
+    assert not sampledGrouping(grouping_specs["injuries_by_veh_make"], CrashesConfig(approximate = True))
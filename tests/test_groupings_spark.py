@@ -0,0 +1,84 @@
+# Shared groupings on a local spark session
+## The groupings rolled up from the combined aggregation of their source must equal the groupings aggregated on their own.
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pyspark")
+if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+    pytest.skip("spark needs a java runtime", allow_module_level = True)
+
+from benchmarks.generate_data import generateCrashData
+from crashes.config import CrashesConfig
+from crashes.context import AnalysisContext
+from crashes.groupings import SharedGroupings, singleGrouping
+from crashes.joins import JoinViews
+from crashes.registry import GroupingSpec, analysis_specs, crash_count_column, grouping_specs, viewConsumers
+from crashes.runner import loadTables
+
+## Grouping of the units sharing the key of injuries_by_veh_make
+units_by_veh_make = GroupingSpec(source = "Units", columns = ("VEH_MAKE_ID",), keys = ("VEH_MAKE_ID",), where = None, \
+                                 measures = {"VEH_MAKE_CNT" : ("count", "*")}, top_n = 5)
+shared_units_groupings = ["injuries_by_veh_make", "units_by_veh_make", "units_by_veh_color"]
+
+
+## Rows of a DataFrame in a comparable order
+def sortedRows(inputDataFrame):
+    return sorted((tuple(row) for row in inputDataFrame.collect()), key = repr)
+
+@pytest.fixture(scope = "module")
+def dataPath(tmp_path_factory):
+    data_path = str(tmp_path_factory.mktemp("groupings"))
+    generateCrashData(data_path, 1, seed = 11, baseCrashes = 300)
+    return data_path
+
+def sharedGroupings(config, tables):
+    return SharedGroupings(config, tables, JoinViews(config, tables, viewConsumers(analysis_specs)), \
+                           {"Units" : shared_units_groupings}, {"Units" : {4, 8}})
+
+
+@pytest.mark.parametrize("useParquet", [True, False])
+def test_sharedGroupingsEqualSingleGroupings(spark, dataPath, monkeypatch, useParquet):
+    monkeypatch.setitem(grouping_specs, "units_by_veh_make", units_by_veh_make)
+    config = CrashesConfig(master = "local[1]", data_filePath = dataPath, use_parquet = useParquet, instrumentation = False)
+    tables = loadTables(spark, config, analysis_specs, {})
+    groupings = sharedGroupings(config, tables)
+    assert groupings.sharedSource("Units")
+    for grouping_name in shared_units_groupings:
+        shared_grouping = groupings.get(grouping_name)
+        single_grouping = singleGrouping(tables["Units"], grouping_name, 1.0)
+        assert shared_grouping.columns == single_grouping.columns
+        assert sortedRows(shared_grouping) == sortedRows(single_grouping), grouping_name
+    groupings.release(4)
+    assert "Units" in groupings.groupings
+    groupings.release(8)
+    assert "Units" not in groupings.groupings
+
+## Sampled groupings are scaled back to about the number of rows of their source; other groupings stay exact
+def test_approximateGroupings(spark, dataPath, monkeypatch):
+    monkeypatch.setitem(grouping_specs, "units_by_veh_make", units_by_veh_make)
+    config = CrashesConfig(master = "local[1]", data_filePath = dataPath, instrumentation = False, approximate = True, approximate_top_n_error = 0.02)
+    tables = loadTables(spark, config, analysis_specs, {})
+    groupings = sharedGroupings(config, tables)
+    unit_count = tables["Units"].count()
+    sample_fraction = groupings.groupingFraction("units_by_veh_color")
+    assert 0 < sample_fraction < 1
+    assert groupings.groupingFraction("injuries_by_veh_make") == 1
+    for grouping_name, measure_name in (("units_by_veh_color", "VEH_COL_CNT"), ("units_by_veh_make", "VEH_MAKE_CNT")):
+        shared_total = sum(row[measure_name] for row in groupings.get(grouping_name).collect())
+        single_total = sum(row[measure_name] for row in singleGrouping(tables["Units"], grouping_name, sample_fraction).collect())
+        # Five standard deviations of the number of sampled rows, scaled back
+        tolerance = 5 * (unit_count * (1 - sample_fraction) / sample_fraction) ** 0.5
+        assert abs(shared_total - unit_count) <= tolerance and abs(single_total - unit_count) <= tolerance, grouping_name
+    assert sortedRows(groupings.get("injuries_by_veh_make")) == sortedRows(singleGrouping(tables["Units"], "injuries_by_veh_make", 1.0))
+
+## Approximate runs estimate the distinct CRASH_IDs of a set with HyperLogLog++ instead of collecting them
+def test_approximateCrashIds(spark, dataPath):
+    config = CrashesConfig(master = "local[1]", data_filePath = dataPath, instrumentation = False)
+    tables = loadTables(spark, config, analysis_specs, {})
+    exact_count = AnalysisContext(spark, config, tables, None, None).crashIds(tables["Units"]).count()
+    approximate_config = CrashesConfig(master = "local[1]", data_filePath = dataPath, instrumentation = False, approximate = True, approximate_distinct_error = 0.02)
+    estimated_crash_ids = AnalysisContext(spark, approximate_config, tables, None, None).crashIds(tables["Units"])
+    assert estimated_crash_ids.columns == [crash_count_column]
+    assert estimated_crash_ids.first()[crash_count_column] == pytest.approx(exact_count, rel = 0.1)
@@ -0,0 +1,116 @@
+# Tests of the bookkeeping of incremental runs: pending batches, CRASH_ID ranges, state settings and merged datasets
+import os
+
+import pytest
+
+import crashes.ingest
+from crashes.config import CrashesConfig
+from crashes.incremental import history_batch_name, pendingBatches, crashIdRangesOverlap, checkStateSettings, stateSettings, \
+                                mergedDatasetNames, unreferencedDatasets
+from crashes.registry import AggregateSpec
+
+
+def writeCsv(directory, tableName, content):
+    os.makedirs(directory, exist_ok = True)
+    with open(os.path.join(directory, f"{tableName}_use.csv"), "w") as outputFile:
+        outputFile.write(content)
+
+def emptyManifest():
+    return {"settings" : stateSettings(CrashesConfig()), "batches" : [], "aggregates" : {}, "crash_id_counts" : {}, \
+            "processed_crash_ids" : [], "processed_crash_id_ranges" : {}}
+
+@pytest.fixture
+def dataPath(tmp_path):
+    writeCsv(tmp_path, "Units", "CRASH_ID\n1\n")
+    writeCsv(tmp_path / "Batches" / "b2", "Units", "CRASH_ID\n3\n")
+    writeCsv(tmp_path / "Batches" / "b1", "Units", "CRASH_ID\n2\n")
+    (tmp_path / "Batches" / "notes.txt").write_text("not a batch")
+    return tmp_path
+
+## Manifest with the history and batch b1 applied
+def appliedManifest(config):
+    manifest = emptyManifest()
+    batches, _ = pendingBatches(config, manifest, ["Units"])
+    for batch_name, _, checksums in batches[:2]:
+        manifest["batches"].append({"name" : batch_name, "checksums" : checksums, "new_crashes" : 1})
+    return manifest
+
+
+def test_pendingBatchesOfEmptyState(dataPath):
+    config = CrashesConfig(data_filePath = str(dataPath))
+    batches, refreshed = pendingBatches(config, emptyManifest(), ["Units"])
+    assert [batch_name for batch_name, _, _ in batches] == [history_batch_name, "b1", "b2"]
+    assert not refreshed
+    assert batches[0][1] is config
+    assert batches[1][1].data_filePath == os.path.join(str(dataPath), "Batches", "b1") and not batches[1][1].use_parquet
+    assert set(batches[1][2]["Units"]) == {"size", "mtime_ns", "sha256"}
+
+def test_pendingBatchesSkipsAppliedBatchesWithoutHashingThem(dataPath, monkeypatch):
+    config = CrashesConfig(data_filePath = str(dataPath))
+    manifest = appliedManifest(config)
+    hashed_files = []
+    checksum = crashes.ingest.fileChecksum
+    monkeypatch.setattr(crashes.ingest, "fileChecksum", lambda filePath: hashed_files.append(filePath) or checksum(filePath))
+    batches, refreshed = pendingBatches(config, manifest, ["Units"])
+    assert [batch_name for batch_name, _, _ in batches] == ["b2"]
+    assert not refreshed
+    assert hashed_files == [os.path.join(str(dataPath), "Batches", "b2", "Units_use.csv")]
+
+## A batch file touched without changing its contents is hashed again once and its new fingerprint recorded
+def test_pendingBatchesRefreshesTouchedBatch(dataPath):
+    config = CrashesConfig(data_filePath = str(dataPath))
+    manifest = appliedManifest(config)
+    b1_file = os.path.join(str(dataPath), "Batches", "b1", "Units_use.csv")
+    recorded_fingerprint = dict(manifest["batches"][1]["checksums"]["Units"])
+    os.utime(b1_file, ns = (recorded_fingerprint["mtime_ns"] + 10 ** 9, recorded_fingerprint["mtime_ns"] + 10 ** 9))
+    batches, refreshed = pendingBatches(config, manifest, ["Units"])
+    assert [batch_name for batch_name, _, _ in batches] == ["b2"]
+    assert refreshed
+    assert manifest["batches"][1]["checksums"]["Units"]["mtime_ns"] == recorded_fingerprint["mtime_ns"] + 10 ** 9
+    assert manifest["batches"][1]["checksums"]["Units"]["sha256"] == recorded_fingerprint["sha256"]
+
+def test_pendingBatchesStopsOnChangedBatch(dataPath):
+    config = CrashesConfig(data_filePath = str(dataPath))
+    manifest = appliedManifest(config)
+    writeCsv(dataPath / "Batches" / "b1", "Units", "CRASH_ID\n4\n")
+    with pytest.raises(ValueError, match = "Batch b1 changed after it was applied"):
+        pendingBatches(config, manifest, ["Units"])
+
+def test_pendingBatchesReportsMissingFile(dataPath):
+    os.remove(os.path.join(str(dataPath), "Batches", "b2", "Units_use.csv"))
+    with pytest.raises(FileNotFoundError):
+        pendingBatches(CrashesConfig(data_filePath = str(dataPath)), emptyManifest(), ["Units"])
+
+def test_crashIdRangesOverlap():
+    assert crashIdRangesOverlap([10, 20], [20, 30])
+    assert crashIdRangesOverlap([10, 20], [12, 15])
+    assert not crashIdRangesOverlap([10, 20], [21, 30])
+    assert not crashIdRangesOverlap([21, 30], [10, 20])
+    # Batches without crashes overlap no range
+    assert not crashIdRangesOverlap([None, None], [10, 20])
+    assert not crashIdRangesOverlap([10, 20], [None, None])
+
+def test_checkStateSettings():
+    config = CrashesConfig()
+    manifest = {"batches" : [{"name" : history_batch_name}], "settings" : stateSettings(config)}
+    checkStateSettings(config, manifest)
+    with pytest.raises(ValueError, match = "rebuild the state"):
+        checkStateSettings(CrashesConfig(legacy_crash_id_joins = True), manifest)
+    with pytest.raises(ValueError, match = "rebuild the state"):
+        checkStateSettings(CrashesConfig(malformed_row_policy = "DROPMALFORMED"), manifest)
+    # Empty states take the settings of the run
+    checkStateSettings(CrashesConfig(legacy_crash_id_joins = True), {"batches" : [], "settings" : stateSettings(config)})
+
+## Sets of CRASH_IDs get a dataset per batch; counts and sums are replaced by the dataset merged with the batch
+def test_mergedDatasetNames():
+    crash_ids_spec = AggregateSpec(keys = ("CRASH_ID",), measures = ())
+    counts_spec = AggregateSpec(keys = ("VEH_COLOR_ID",), measures = ("VEH_COL_CNT",))
+    assert mergedDatasetNames(crash_ids_spec, [], "crash_ids/history") == ["crash_ids/history"]
+    assert mergedDatasetNames(crash_ids_spec, ["crash_ids/history"], "crash_ids/b1") == ["crash_ids/history", "crash_ids/b1"]
+    assert mergedDatasetNames(counts_spec, [], "counts/history") == ["counts/history"]
+    assert mergedDatasetNames(counts_spec, ["counts/history"], "counts/b1") == ["counts/b1"]
+
+def test_unreferencedDatasets():
+    manifest = {"aggregates" : {"crash_ids" : ["crash_ids/history"], "counts" : ["counts/history"]}}
+    new_manifest = {"aggregates" : {"crash_ids" : ["crash_ids/history", "crash_ids/b1"], "counts" : ["counts/b1"]}}
+    assert unreferencedDatasets(manifest, new_manifest) == ["counts/history"]
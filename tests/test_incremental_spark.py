@@ -0,0 +1,77 @@
+# Equivalence of incremental and full runs on a local spark session
+## Synthetic crashes are split by CRASH_ID into the history and two batches, the second repeating crashes of the first:
+## the aggregates merged by the incremental run must equal the aggregates of all crashes computed at once.
+import csv
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("pyspark")
+if not (os.environ.get("JAVA_HOME") or shutil.which("java")):
+    pytest.skip("spark needs a java runtime", allow_module_level = True)
+
+from benchmarks.generate_data import first_crash_id, generateCrashData
+from crashes.config import CrashesConfig
+from crashes.context import AnalysisContext
+from crashes.groupings import SharedGroupings
+from crashes.incremental import readStateDatasets, readStateManifest, runIncremental
+from crashes.joins import JoinViews
+from crashes.registry import analysis_specs, viewConsumers, sourceGroupings, groupingConsumers, loadAnalysisFunctions
+from crashes.runner import loadTables
+from crashes.schemas import table_schemas
+
+test_crashes = 400
+## CRASH_IDs (offsets from the first one) of the history and of each batch; b2 repeats the last 10 crashes of b1
+batch_crash_id_ranges = {"history" : (0, 250), "b1" : (250, 330), "b2" : (320, 400)}
+
+
+## Write the rows of the crashes in the given range of every table to a data directory
+def splitCrashData(sourcePath, outputPath, crashIdRange):
+    os.makedirs(outputPath, exist_ok = True)
+    for table_name in table_schemas:
+        with open(os.path.join(sourcePath, f"{table_name}_use.csv"), newline = "") as inputFile, \
+             open(os.path.join(outputPath, f"{table_name}_use.csv"), "w", newline = "") as outputFile:
+            reader = csv.reader(inputFile)
+            writer = csv.writer(outputFile)
+            header = next(reader)
+            writer.writerow(header)
+            crash_id_index = header.index("CRASH_ID")
+            writer.writerows(row for row in reader if first_crash_id + crashIdRange[0] <= int(row[crash_id_index]) < first_crash_id + crashIdRange[1])
+
+## Rows of a DataFrame in a comparable order
+def sortedRows(inputDataFrame):
+    columns = sorted(inputDataFrame.columns)
+    return sorted((tuple(row[column] for column in columns) for row in inputDataFrame.collect()), key = repr)
+
+
+def test_incrementalAggregatesEqualFullAggregates(spark, tmp_path):
+    full_path = str(tmp_path / "full")
+    generateCrashData(full_path, 1, seed = 7, baseCrashes = test_crashes)
+    incremental_path = str(tmp_path / "incremental")
+    for batch_name, crash_id_range in batch_crash_id_ranges.items():
+        splitCrashData(full_path, incremental_path if batch_name == "history" else os.path.join(incremental_path, "Batches", batch_name), crash_id_range)
+
+    incremental_config = CrashesConfig(master = "local[1]", data_filePath = incremental_path, incremental = True, instrumentation = False)
+    result_rows, batch_rows, _ = runIncremental(spark, incremental_config, list(analysis_specs), {})
+    assert batch_rows == [("history", 250), ("b1", 80), ("b2", 70)]
+    # A second run has no batch left to apply
+    assert runIncremental(spark, incremental_config, list(analysis_specs), {})[1] == []
+    manifest = readStateManifest(incremental_config)
+
+    full_config = CrashesConfig(master = "local[1]", data_filePath = full_path, instrumentation = False)
+    tables = loadTables(spark, full_config, analysis_specs, {})
+    join_views = JoinViews(full_config, tables, viewConsumers(analysis_specs))
+    groupings = SharedGroupings(full_config, tables, join_views, sourceGroupings(analysis_specs), groupingConsumers(analysis_specs))
+    ctx = AnalysisContext(spark, full_config, tables, join_views, groupings)
+    for spec, (_, incremental_result) in zip(analysis_specs, result_rows):
+        aggregate, derive_result = loadAnalysisFunctions(spec)
+        full_aggregates = aggregate(ctx)
+        for aggregate_name, aggregate_spec in spec.aggregates.items():
+            incremental_aggregate = readStateDatasets(spark, incremental_config, manifest["aggregates"][aggregate_name])
+            assert sortedRows(incremental_aggregate) == sortedRows(full_aggregates[aggregate_name]), f"analysis {spec.number}: {aggregate_name}"
+            if not aggregate_spec.measures:
+                assert manifest["crash_id_counts"][aggregate_name] == full_aggregates[aggregate_name].count(), f"analysis {spec.number}: {aggregate_name}"
+        # Counts of CRASH_IDs are derived from the counts recorded in the manifest
+        if not any(aggregate_spec.measures for aggregate_spec in spec.aggregates.values()):
+            assert incremental_result == derive_result(full_aggregates), f"analysis {spec.number}"
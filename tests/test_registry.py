@@ -0,0 +1,28 @@
+# Tests of the analysis registry: selection of the analyses and of the columns they read
+import pytest
+
+from crashes.registry import analysis_specs, join_view_specs, selectAnalyses, requiredColumns
+
+
+def test_selectAnalysesDefaultsToAllAnalyses():
+    assert selectAnalyses() == list(analysis_specs)
+    assert selectAnalyses("") == list(analysis_specs)
+
+def test_selectAnalysesByNumberAndNameInRegistryOrder():
+    specs = selectAnalyses("8, insured_damage_crashes,1,8")
+    assert [spec.number for spec in specs] == [1, 7, 8]
+
+def test_selectAnalysesRejectsUnknownAnalysis():
+    with pytest.raises(ValueError, match = "Unknown analysis: 42"):
+        selectAnalyses("1,42")
+
+## Analysis 7 reads its units and damages directly
+def test_requiredColumnsOfTables():
+    columns = requiredColumns(selectAnalyses("7"))
+    assert columns == {"Units" : {"CRASH_ID", "VEH_DMAG_SCL_1_ID", "VEH_DMAG_SCL_2_ID", "FIN_RESP_TYPE_ID"}, \
+                       "Damages" : {"CRASH_ID", "DAMAGED_PROPERTY"}}
+
+## Analysis 5 reads its tables through the shared view it uses
+def test_requiredColumnsOfViews():
+    columns = requiredColumns(selectAnalyses("5"))
+    assert columns == {table_name : set(table_column_names) for table_name, table_column_names in join_view_specs["person_units"].tables.items()}